@@ -34,11 +34,12 @@ import time
 import random
 import json
 import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
+from itertools import chain, islice
 from urllib.parse import urlparse, parse_qs
 import requests
-from supabase import create_client
-from secrets_loader import load_supabase_credentials
+from secrets_loader import create_supabase_client, load_supabase_credentials
 
 SUPABASE_URL, SUPABASE_KEY = load_supabase_credentials()
 import os
@@ -52,7 +53,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # === Supabase Setup ===
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# The price history insert threads (PRICE_HISTORY_INSERT_WORKERS) share the
+# client's keep-alive pool; its 10-connection cap leaves room for all of them.
+supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # === Rate Limiting Configuration ===
 RATE_LIMIT_CONFIG = {
@@ -184,8 +187,12 @@ class CheckpointManager:
         """Save checkpoint to disk"""
         try:
             self.data['last_updated'] = datetime.now().isoformat()
+            # Saved after every product, and processed_products grows with the
+            # run. json.dump() and indent= both force the pure-Python encoder;
+            # a compact one-shot dumps() stays on the C encoder.
+            payload = json.dumps(self.data, separators=(',', ':'))
             with open(self.checkpoint_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
+                f.write(payload)
             logger.debug(f"Checkpoint saved to {self.checkpoint_file}")
         except Exception as e:
             logger.error(f"Failed to save checkpoint: {e}")
@@ -473,32 +480,45 @@ def extract_historical_prices_api(product_id, referer=None, preferred_variant=No
     return list(deduped.values())
 
 
-def fetch_products_paginated(batch_size=500):
+def iter_products_paginated(batch_size=500):
     """
-    Fetch all products from database using pagination to handle large datasets.
-    Returns list of all products.
+    Yield products from the database page by page, so only one page is
+    resident at a time. The next page is requested once the consumer has
+    drained the current one.
     """
-    all_products = []
-    offset = 0
+    last_id = 0
+    fetched = 0
 
     while True:
+        # Keyset pagination: seek past the last id on the primary key index
+        # instead of having Postgres scan and discard `offset` rows per page.
+        # Ordering by id also keeps start/end indices stable across runs.
         response = supabase.table("products")\
             .select("id, url, variant, set_id, sets(release_date)")\
-            .range(offset, offset + batch_size - 1)\
+            .gt("id", last_id)\
+            .order("id")\
+            .limit(batch_size)\
             .execute()
 
         if not response.data:
-            break
+            return
 
-        all_products.extend(response.data)
-        logger.debug(f"Fetched {len(response.data)} products (total: {len(all_products)})")
+        fetched += len(response.data)
+        logger.debug(f"Fetched {len(response.data)} products (total: {fetched})")
+        yield from response.data
 
         if len(response.data) < batch_size:
-            break  # Last page
+            return  # Last page
 
-        offset += batch_size
+        last_id = response.data[-1]["id"]
 
-    return all_products
+
+def fetch_products_paginated(batch_size=500):
+    """
+    Fetch all products from database using pagination to handle large datasets.
+    Returns list of all products.
+    """
+    return list(iter_products_paginated(batch_size))
 
 
 def fetch_existing_price_dates(product_id, start_date, end_date, batch_size=500):
@@ -536,31 +556,89 @@ def fetch_existing_price_dates(product_id, start_date, end_date, batch_size=500)
     return existing_dates
 
 
-def batch_insert_price_history(entries, batch_size=100):
+# Rows per PostgREST insert. A product contributes at most 365 rows, so one
+# request covers a whole product instead of four.
+PRICE_HISTORY_INSERT_BATCH_SIZE = 500
+
+# Upper bound on concurrent batch inserts. Kept small: the sync client shares
+# one connection pool and Supabase's free tier caps concurrent connections.
+PRICE_HISTORY_INSERT_WORKERS = 4
+
+
+def _chunked(iterable, size):
+    """Yield successive lists of up to size items from any iterable, generators included."""
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _insert_price_history_batch(batch):
+    """
+    Insert one batch, falling back to per-row inserts if the batch is rejected.
+    Returns tuple of (inserted_count, failed_count).
+    """
+    try:
+        # return=minimal: the inserted rows are never read back, so skip
+        # having PostgREST serialize them into the response body.
+        supabase.table("product_price_history").insert(batch, returning="minimal").execute()
+        logger.debug(f"Batch inserted {len(batch)} records")
+        return len(batch), 0
+    except Exception as e:
+        logger.error(f"Batch insert failed: {e}")
+
+    # Fall back to individual inserts for this batch
+    inserted_count = 0
+    failed_count = 0
+    for entry in batch:
+        try:
+            supabase.table("product_price_history").insert(entry).execute()
+            inserted_count += 1
+        except Exception as inner_e:
+            logger.error(f"Individual insert failed for {entry.get('recorded_at', 'unknown')}: {inner_e}")
+            failed_count += 1
+    return inserted_count, failed_count
+
+
+def batch_insert_price_history(entries, batch_size=PRICE_HISTORY_INSERT_BATCH_SIZE,
+                               max_workers=PRICE_HISTORY_INSERT_WORKERS):
     """
     Insert price history entries in batches to avoid N+1 query pattern.
+    entries may be any iterable; it is consumed one batch at a time.
     Duplicates are prevented at the application level by filtering existing dates.
+    When there is more than one batch, up to max_workers batches are in flight
+    at once so their round-trips overlap; the next batch is only pulled from
+    entries once one of them finishes.
     Returns tuple of (inserted_count, failed_count).
     """
+    # An empty list skips the chunking and peek machinery. Generators are
+    # always truthy and take the normal path.
+    if not entries:
+        return 0, 0
+
+    batches = _chunked(entries, batch_size)
+    # Peek two batches: a lone batch is inserted inline without a pool.
+    head = list(islice(batches, 2))
+
+    if len(head) <= 1 or max_workers <= 1:
+        results = map(_insert_price_history_batch, chain(head, batches))
+    else:
+        # Not pool.map: that submits every batch up front, draining entries
+        # into memory. Keep at most max_workers futures outstanding instead.
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            in_flight = set()
+            for batch in chain(head, batches):
+                if len(in_flight) >= max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                in_flight.add(pool.submit(_insert_price_history_batch, batch))
+            results.extend(future.result() for future in in_flight)
+
     inserted_count = 0
     failed_count = 0
-
-    for i in range(0, len(entries), batch_size):
-        batch = entries[i:i + batch_size]
-        try:
-            supabase.table("product_price_history").insert(batch).execute()
-            inserted_count += len(batch)
-            logger.debug(f"Batch inserted {len(batch)} records")
-        except Exception as e:
-            logger.error(f"Batch insert failed: {e}")
-            # Fall back to individual inserts for this batch
-            for entry in batch:
-                try:
-                    supabase.table("product_price_history").insert(entry).execute()
-                    inserted_count += 1
-                except Exception as inner_e:
-                    logger.error(f"Individual insert failed for {entry.get('recorded_at', 'unknown')}: {inner_e}")
-                    failed_count += 1
+    for inserted, failed in results:
+        inserted_count += inserted
+        failed_count += failed
 
     return inserted_count, failed_count
 
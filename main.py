@@ -1,9 +1,12 @@
+import argparse
+import functools
 import ipaddress
 import logging
 import os
 import platform
 import random
 import shutil
+import signal
 import socket
 import tempfile
 import time
@@ -12,24 +15,25 @@ import warnings
 import re
 
 import requests
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from supabase import create_client
 from urllib.parse import urlparse, parse_qs
 from urllib3.exceptions import NotOpenSSLWarning
 from webdriver_manager.chrome import ChromeDriverManager
 
-from secrets_loader import load_supabase_credentials
+from secrets_loader import create_supabase_client, load_supabase_credentials
 
 SUPABASE_URL, SUPABASE_KEY = load_supabase_credentials()
 
 # === Image fetch hardening ===
 IMAGE_MAX_BYTES = 8 * 1024 * 1024  # 8 MiB
-IMAGE_ALLOWED_EXTS = {"jpg", "jpeg", "png", "webp"}
-IMAGE_ALLOWED_MIMES = {"image/jpeg", "image/png", "image/webp"}
+IMAGE_ALLOWED_EXTS = frozenset({"jpg", "jpeg", "png", "webp"})
+IMAGE_ALLOWED_MIMES = frozenset({"image/jpeg", "image/png", "image/webp"})
 # Magic numbers (file signatures) for the formats we accept.
 IMAGE_MAGIC_BYTES: list[tuple[bytes, str]] = [
     (b"\xff\xd8\xff", "jpeg"),
@@ -195,24 +199,30 @@ def _detect_image_format(buf: bytes) -> str | None:
 warnings.simplefilter("ignore", NotOpenSSLWarning)
 
 
+_DASH_TRANS = str.maketrans(dict.fromkeys(
+    '\u2010'    # Hyphen
+    '\u2011'    # Non-breaking hyphen
+    '\u2012'    # Figure dash
+    '\u2013'    # En dash
+    '\u2014'    # Em dash
+    '\u2015'    # Horizontal bar
+    '\u2212',   # Minus sign
+    '-',
+))
+
+
+# Currency symbol and thousands separators dropped before float() on scraped
+# price text such as "$1,234.56".
+_PRICE_STRIP = str.maketrans('', '', '$,')
+
+
 def normalize_hyphens(text):
     """
     Normalize various Unicode hyphen/dash characters to regular ASCII hyphen.
     Handles: non-breaking hyphen, hyphen, figure dash, en dash, em dash,
     horizontal bar, and minus sign.
     """
-    hyphen_chars = [
-        '\u2010',  # Hyphen
-        '\u2011',  # Non-breaking hyphen
-        '\u2012',  # Figure dash
-        '\u2013',  # En dash
-        '\u2014',  # Em dash
-        '\u2015',  # Horizontal bar
-        '\u2212',  # Minus sign
-    ]
-    for char in hyphen_chars:
-        text = text.replace(char, '-')
-    return text
+    return text.translate(_DASH_TRANS)
 
 
 def extract_tcgplayer_product_id(url):
@@ -358,6 +368,11 @@ def _parse_bucket_price(value):
     return price
 
 
+def _normalize_scraped_price(price):
+    """Return a scraped price if it is positive, else None."""
+    return price if price is not None and price > 0 else None
+
+
 def parse_daily_sales_buckets(buckets, product_id):
     """
     Convert raw daily buckets from the infinite-api (range=month) into
@@ -617,7 +632,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # === Supabase Setup ===
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Price writes (PostgREST) and image uploads (Storage) go through one
+# keep-alive pool, so a run reuses a few TLS connections.
+supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # === Selenium Driver Setup ===
 def create_driver():
@@ -674,20 +691,36 @@ def create_driver():
     return driver, user_data_dir
 
 
+# Chrome profile dirs hold thousands of small cache files; deleting them runs
+# here so the caller is not blocked on one unlink per file. Pool workers are
+# joined at interpreter exit, so a pending delete still finishes.
+_cleanup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="profile-cleanup")
+
+
+def _remove_user_data_dir(user_data_dir):
+    """Delete a Chrome user-data dir; runs on _cleanup_pool."""
+    try:
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+        logger.debug(f"Cleaned up temp directory: {user_data_dir}")
+    except Exception as e:
+        logger.warning(f"Error cleaning up temp directory: {e}")
+
+
 def cleanup_driver(driver, user_data_dir):
-    """Properly cleanup WebDriver and temporary directory."""
+    """
+    Properly cleanup WebDriver and temporary directory.
+    The driver is quit inline; the directory is removed in the background.
+    Returns the removal Future, or None when there was no directory to remove.
+    """
     try:
         if driver:
             driver.quit()
     except Exception as e:
         logger.warning(f"Error quitting driver: {e}")
 
-    try:
-        if user_data_dir and os.path.exists(user_data_dir):
-            shutil.rmtree(user_data_dir, ignore_errors=True)
-            logger.debug(f"Cleaned up temp directory: {user_data_dir}")
-    except Exception as e:
-        logger.warning(f"Error cleaning up temp directory: {e}")
+    if user_data_dir and os.path.exists(user_data_dir):
+        return _cleanup_pool.submit(_remove_user_data_dir, user_data_dir)
+    return None
 
 # === Image Download and Upload Logic ===
 def download_and_upload_image(image_url, product_id):
@@ -828,6 +861,21 @@ def download_and_upload_image(image_url, product_id):
         return None
 
 # === Enhanced scraper with image extraction ===
+# Image URLs containing any of these are site chrome, not product art.
+_SKIP_KEYWORDS = frozenset({'logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card'})
+_SKIP_RE = re.compile('|'.join(map(re.escape, sorted(_SKIP_KEYWORDS))), re.IGNORECASE)
+# One "<url> <width>w" candidate of a srcset attribute.
+_SRCSET_RE = re.compile(r'(?:^|,)\s*([^\s,]\S*)\s+(\d+)w')
+
+
+def _parse_srcset(srcset):
+    """Return (url, width) of the widest srcset candidate, or (None, 0)."""
+    best_src, best_width = max(
+        _SRCSET_RE.findall(srcset), key=lambda m: int(m[1]), default=(None, 0)
+    )
+    return best_src, int(best_width)
+
+
 def get_price_and_image_from_url(driver, url, session=None, variant=None, db_product_id=None):
     """
     Extract market price (API-only) and image URL from TCGPlayer product page.
@@ -888,8 +936,7 @@ def get_price_and_image_from_url(driver, url, session=None, variant=None, db_pro
                         continue
 
                     # Skip non-product images
-                    skip_keywords = ['logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card']
-                    if any(skip in src.lower() for skip in skip_keywords):
+                    if _SKIP_RE.search(src):
                         continue
 
                     # For TCGPlayer CDN images, prefer higher resolution
@@ -897,23 +944,7 @@ def get_price_and_image_from_url(driver, url, session=None, variant=None, db_pro
                         # Try to get the highest resolution from srcset
                         srcset = img.get_attribute('srcset')
                         if srcset:
-                            # Parse srcset to get highest resolution
-                            srcset_entries = srcset.split(',')
-                            best_src = src
-                            best_width = 0
-
-                            for entry in srcset_entries:
-                                entry = entry.strip()
-                                if ' ' in entry:
-                                    url_part, width_part = entry.rsplit(' ', 1)
-                                    try:
-                                        width = int(width_part.replace('w', ''))
-                                        if width > best_width:
-                                            best_width = width
-                                            best_src = url_part
-                                    except ValueError:
-                                        continue
-
+                            best_src, best_width = _parse_srcset(srcset)
                             if best_width > 0:
                                 result['image_url'] = best_src
                                 break
@@ -942,6 +973,10 @@ def get_price_and_image_from_url(driver, url, session=None, variant=None, db_pro
         return {'price': None, 'image_url': None, 'sales_buckets': [], 'tcgplayer_product_id': None}
 
 # === Helper function to parse timestamps safely ===
+# Supabase hands back the same last_updated / last_image_update strings for
+# whole runs of products, and datetimes are immutable, so results are safe to
+# share between callers.
+@functools.lru_cache(maxsize=4096)
 def parse_timestamp(timestamp_str):
     """Parse timestamp string and return timezone-aware datetime object"""
     if not timestamp_str:
@@ -1000,7 +1035,7 @@ def fetch_and_store_exchange_rate():
                 # BOC may use various Unicode hyphen characters
                 # Normalize to regular ASCII hyphen for parsing
                 normalized_date_str = normalize_hyphens(rate_date_str)
-                rate_date = datetime.strptime(normalized_date_str, "%Y-%m-%d")
+                rate_date = datetime.fromisoformat(normalized_date_str)
                 break
 
         if rate is None or rate_date is None:
@@ -1022,34 +1057,107 @@ def fetch_and_store_exchange_rate():
         logger.error(f"Failed to fetch or store exchange rate: {e}")
 
 
-def fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size=500):
+def build_update_or_query(price_interval_ago, twenty_four_hours_ago):
     """
-    Fetch products that need updates using pagination.
-    Returns list of products needing price or image updates.
+    Build the PostgREST or= filter selecting products due a price or image update.
+    Mirrors products_needing_update (migration 0022) for when that RPC is missing.
+    Each cutoff is stringified once; equal cutoffs share one isoformat() call.
     """
-    all_products = []
-    offset = 0
-    or_filter = f"last_updated.is.null,usd_price.is.null,last_updated.lt.{price_interval_ago.isoformat()},image_url.is.null,last_image_update.is.null,last_image_update.lt.{twenty_four_hours_ago.isoformat()}"
+    iso_price = price_interval_ago.isoformat()
+    iso_img = iso_price if twenty_four_hours_ago == price_interval_ago else twenty_four_hours_ago.isoformat()
+    return (
+        f"last_updated.is.null,usd_price.is.null,last_updated.lt.{iso_price},"
+        f"image_url.is.null,last_image_update.is.null,last_image_update.lt.{iso_img}"
+    )
+
+
+# Set once the products_needing_update RPC turns out to be missing (migration
+# 0022 not yet applied) so later pages and runs go straight to the or= filter.
+_needs_update_rpc_missing = False
+
+
+def _is_missing_function_error(exc):
+    """True when PostgREST reports the RPC target does not exist (PGRST202/42883)."""
+    text = str(exc)
+    return "PGRST202" in text or "42883" in text or "could not find the function" in text.lower()
+
+
+def _fetch_needing_update_page(rpc_params, or_filter, last_id, batch_size):
+    """Fetch one id-ordered page via the RPC, or the or= filter if it is missing."""
+    global _needs_update_rpc_missing
+
+    if not _needs_update_rpc_missing:
+        try:
+            return supabase.rpc(
+                "products_needing_update",
+                {**rpc_params, "after_id": last_id, "page_size": batch_size},
+            ).execute()
+        except Exception as e:
+            if not _is_missing_function_error(e):
+                raise
+            _needs_update_rpc_missing = True
+            logger.warning(
+                "products_needing_update RPC not found (migration 0022 not applied?); "
+                "falling back to the PostgREST or= filter"
+            )
+
+    # Keyset pagination on the primary key: each page is an index seek
+    # past last_id rather than an OFFSET scan over every earlier row.
+    return supabase.table("products")\
+        .select("id, url, usd_price, image_url, last_updated, last_image_update, variant, set_id, product_type_id")\
+        .or_(or_filter)\
+        .gt("id", last_id)\
+        .order("id")\
+        .limit(batch_size)\
+        .execute()
+
+
+def iter_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size=500):
+    """
+    Yield products needing price or image updates, one page resident at a time.
+    """
+    last_id = 0
+    fetched = 0
+    rpc_params = {
+        "price_cutoff": price_interval_ago.isoformat(),
+        "image_cutoff": twenty_four_hours_ago.isoformat(),
+    }
+    or_filter = build_update_or_query(price_interval_ago, twenty_four_hours_ago)
 
     while True:
-        response = supabase.table("products")\
-            .select("id, url, usd_price, image_url, last_updated, last_image_update, variant, set_id, product_type_id")\
-            .or_(or_filter)\
-            .range(offset, offset + batch_size - 1)\
-            .execute()
+        response = _fetch_needing_update_page(rpc_params, or_filter, last_id, batch_size)
 
         if not response.data:
-            break
+            return
 
-        all_products.extend(response.data)
-        logger.debug(f"Fetched {len(response.data)} products needing updates (total: {len(all_products)})")
+        fetched += len(response.data)
+        logger.debug(f"Fetched {len(response.data)} products needing updates (total: {fetched})")
+        yield from response.data
 
         if len(response.data) < batch_size:
-            break  # Last page
+            return  # Last page
 
-        offset += batch_size
+        last_id = response.data[-1]["id"]
 
-    return all_products
+
+def fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size=500):
+    """
+    Fetch products that need updates using pagination.
+    Returns list of products needing price or image updates.
+    """
+    return list(iter_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size))
+
+
+def group_products_by_type(products):
+    """Count products per (set_id, product_type_id, variant) tuple.
+
+    Tuple keys avoid building a label string per product; the log line
+    formats each distinct group once. A falsy variant is stored as None.
+    """
+    counts = defaultdict(int)
+    for product in products:
+        counts[(product['set_id'], product['product_type_id'], product.get('variant') or None)] += 1
+    return counts
 
 
 def update_prices():
@@ -1092,24 +1200,20 @@ def update_prices():
     logger.info(f"Found {len(products_to_update)} products to update")
 
     # Group products by type for logging
-    products_by_type = {}
-    for product in products_to_update:
-        key = f"Set:{product['set_id']}-Type:{product['product_type_id']}"
-        if product.get('variant'):
-            key += f"-Variant:{product['variant']}"
-        if key not in products_by_type:
-            products_by_type[key] = 0
-        products_by_type[key] += 1
+    products_by_type = group_products_by_type(products_to_update)
 
     logger.info("Products to update by type:")
-    for key, count in products_by_type.items():
+    for (set_id, product_type_id, variant), count in products_by_type.items():
+        key = f"Set:{set_id}-Type:{product_type_id}"
+        if variant:
+            key += f"-Variant:{variant}"
         logger.info(f"   - {key}: {count} products")
 
     driver = None
     user_data_dir = None
     api_session = requests.Session()
     updated_count = 0
-    price_history_batch = []  # Collect price history entries for batch insert
+    product_updates_batch = []  # Per-product updates (+ price history) for batch write
     sales_history_batch = []  # Collect daily sales-volume rows for batch upsert
     listings_history_batch = []  # Collect listings-depth snapshots for batch upsert
     sales_rows_written = 0
@@ -1139,10 +1243,10 @@ def update_prices():
                 variant=variant,
                 db_product_id=product_id,
             )
-            price = scraped_data.get('price')
-            if price is not None and price <= 0:
-                logger.warning(f"   Ignoring non-positive price from scrape: {price}")
-                price = None
+            raw_price = scraped_data.get('price')
+            price = _normalize_scraped_price(raw_price)
+            if price is None and raw_price is not None:
+                logger.warning(f"   Ignoring non-positive price from scrape: {raw_price}")
             tcg_image_url = scraped_data.get('image_url')
 
             update_data = {}
@@ -1158,14 +1262,9 @@ def update_prices():
                     needs_price_update = last_updated_dt < price_interval_ago
 
             if price is not None and needs_price_update:
+                # record_price_batch also writes the price history row
                 update_data["usd_price"] = price
                 update_data["last_updated"] = datetime.now(timezone.utc).isoformat()
-
-                # Add to price history batch instead of individual insert
-                price_history_batch.append({
-                    "product_id": product_id,
-                    "usd_price": price
-                })
                 logger.info(f"   Updated price: ${price:.2f}")
 
             # === Sales volume + listings capture ===
@@ -1246,21 +1345,18 @@ def update_prices():
                 update_data["last_image_update"] = datetime.now(timezone.utc).isoformat()
                 logger.warning(f"   No image found, updated timestamp to avoid retry")
 
-            # Update database if we have any updates
+            # Queue the database update; written in batches below
             if update_data:
-                try:
-                    supabase.table("products").update(update_data).eq("id", product_id).execute()
-                    updated_count += 1
-                    logger.info(f"   Database updated for product {product_id}{variant_info}")
-                except Exception as e:
-                    logger.error(f"   Database update failed for product {product_id}: {e}")
+                product_updates_batch.append({"product_id": product_id, **update_data})
+                logger.info(f"   Queued database update for product {product_id}{variant_info}")
             else:
                 logger.info(f"   No updates needed for product {product_id}{variant_info}")
 
-            # Batch insert price history every 100 entries
-            if len(price_history_batch) >= 100:
-                _flush_price_history_batch(price_history_batch)
-                price_history_batch = []
+            # Batch write product updates every 100 entries
+            if len(product_updates_batch) >= 100:
+                written, _ = _flush_product_updates(product_updates_batch)
+                updated_count += written
+                product_updates_batch = []
 
             # Batch upsert sales/listings history every 100 entries
             if len(sales_history_batch) >= 100:
@@ -1277,10 +1373,6 @@ def update_prices():
 
             time.sleep(1)  # polite delay between requests
 
-        # Flush remaining price history entries
-        if price_history_batch:
-            _flush_price_history_batch(price_history_batch)
-
         # Flush remaining sales/listings history entries
         if sales_history_batch:
             flushed_ok, flushed_failed = _flush_sales_history_batch(sales_history_batch)
@@ -1293,6 +1385,14 @@ def update_prices():
             listings_rows_failed += flushed_failed
 
     finally:
+        # Flush remaining product updates, also when the run is cut short:
+        # they carry scraped prices and the URLs of images already uploaded.
+        if product_updates_batch:
+            try:
+                written, _ = _flush_product_updates(product_updates_batch)
+                updated_count += written
+            except Exception as e:
+                logger.error(f"Failed to flush {len(product_updates_batch)} queued product updates: {e}")
         cleanup_driver(driver, user_data_dir)
         try:
             api_session.close()
@@ -1306,6 +1406,61 @@ def update_prices():
     )
 
 
+# Set once the record_price_batch RPC turns out to be missing (migration 0024
+# not yet applied) so later flushes go straight to the per-product path.
+_record_price_rpc_missing = False
+
+
+def _flush_product_updates(updates):
+    """
+    Write a batch of per-product updates ({"product_id": ..., **columns}),
+    plus a price history row for each one carrying usd_price.
+    One record_price_batch RPC covers the whole batch in a single transaction;
+    if it is missing or fails, the batch is replayed as one PATCH per product
+    and a separate price history insert.
+    Returns tuple of (products_written, failed_count).
+    """
+    global _record_price_rpc_missing
+
+    if not updates:
+        return 0, 0
+
+    if not _record_price_rpc_missing:
+        try:
+            supabase.rpc("record_price_batch", {"rows": updates}).execute()
+            logger.debug(f"Recorded {len(updates)} product updates")
+            return len(updates), 0
+        except Exception as e:
+            if _is_missing_function_error(e):
+                _record_price_rpc_missing = True
+                logger.warning(
+                    "record_price_batch RPC not found (migration 0024 not applied?); "
+                    "writing product updates individually"
+                )
+            else:
+                logger.error(f"Batch product update failed: {e}")
+
+    history = [
+        {"product_id": u["product_id"], "usd_price": u["usd_price"]}
+        for u in updates if u.get("usd_price") is not None
+    ]
+    _flush_price_history_batch(history)
+
+    written = 0
+    failed_count = 0
+    for update in updates:
+        product_id = update["product_id"]
+        columns = {k: v for k, v in update.items() if k != "product_id"}
+        try:
+            supabase.table("products").update(columns).eq("id", product_id).execute()
+            written += 1
+        except Exception as e:
+            logger.error(f"   Database update failed for product {product_id}: {e}")
+            failed_count += 1
+
+    return written, failed_count
+
+
 def _flush_price_history_batch(batch):
     """
     Insert a batch of price history entries.
@@ -1314,27 +1469,72 @@ def _flush_price_history_batch(batch):
     if not batch:
         return 0, 0
 
-    success_count = 0
-    failed_count = 0
-
     try:
         supabase.table("product_price_history").insert(batch).execute()
-        success_count = len(batch)
         logger.debug(f"Batch inserted {len(batch)} price history records")
+        return len(batch), 0
     except Exception as e:
         logger.error(f"Batch price history insert failed: {e}")
-        # Fall back to individual inserts
-        for entry in batch:
-            try:
-                supabase.table("product_price_history").insert(entry).execute()
-                success_count += 1
-            except Exception as inner_e:
-                logger.error(f"Individual price history insert failed for product {entry.get('product_id')}: {inner_e}")
-                failed_count += 1
+
+    # Usually a product that already has today's row under the unique
+    # (product_id, recorded_at::date) index. One ON CONFLICT DO NOTHING
+    # round-trip skips those server-side instead of retrying row by row.
+    inserted = _insert_price_history_skip_duplicates(batch)
+    if inserted is not None:
+        return inserted, 0
+
+    success_count = 0
+    failed_count = 0
+
+    # Fall back to individual inserts
+    for entry in batch:
+        try:
+            supabase.table("product_price_history").insert(entry).execute()
+            success_count += 1
+        except Exception as inner_e:
+            logger.error(f"Individual price history insert failed for product {entry.get('product_id')}: {inner_e}")
+            failed_count += 1
 
     return success_count, failed_count
 
 
+# Set once the insert_price_history_skip_duplicates RPC turns out to be
+# missing (migration 0023 not yet applied) so later flushes skip the call.
+_price_history_rpc_missing = False
+
+
+def _insert_price_history_skip_duplicates(batch):
+    """
+    Insert a batch through the ON CONFLICT DO NOTHING RPC.
+    Returns the number of rows inserted, or None if the caller should fall
+    back to per-row inserts (RPC missing, or the batch failed for another
+    reason such as a CHECK violation).
+    """
+    global _price_history_rpc_missing
+
+    if _price_history_rpc_missing:
+        return None
+
+    try:
+        response = supabase.rpc("insert_price_history_skip_duplicates", {"rows": batch}).execute()
+    except Exception as e:
+        if _is_missing_function_error(e):
+            _price_history_rpc_missing = True
+            logger.warning(
+                "insert_price_history_skip_duplicates RPC not found "
+                "(migration 0023 not applied?); using per-row inserts"
+            )
+        else:
+            logger.error(f"Duplicate-skipping price history insert failed: {e}")
+        return None
+
+    inserted = response.data if isinstance(response.data, int) else len(batch)
+    skipped = len(batch) - inserted
+    if skipped:
+        logger.info(f"Skipped {skipped} price history rows already recorded today")
+    return inserted
+
+
 # Set once a flush hits a missing-table error (migration 0015 not yet applied)
 # so later volume flushes in the same run skip doomed network calls. Both
 # volume tables come from the same migration, so one flag covers both.
@@ -1485,10 +1685,21 @@ def check_shopify_prices(threshold_pct: float = 5.0) -> None:
         logger.error(f"Shopify price check failed: {e}")
 
 
-# === Run Script ===
-if __name__ == "__main__":
-    import argparse
+# === Scheduling ===
+def seconds_until_next_utc_interval(interval_hours=4, now=None):
+    """Seconds from now until the next UTC boundary that is a multiple of interval_hours."""
+    now = now or datetime.now(timezone.utc)
+    next_hour = ((now.hour // interval_hours) + 1) * interval_hours
+    # Adding a timedelta rolls past midnight on its own, so a boundary at or
+    # beyond 24:00 needs no special case.
+    next_time = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=next_hour - now.hour)
+    return (next_time - now).total_seconds()
+
 
+# === CLI ===
+@functools.lru_cache(maxsize=1)
+def get_parser():
+    """Build the command-line parser once; parse_args() leaves it unmodified."""
     parser = argparse.ArgumentParser(description="TCGPlayer Price Scraper")
     parser.add_argument(
         "--run-now",
@@ -1500,7 +1711,15 @@ if __name__ == "__main__":
         action="store_true",
         help="Enable debug logging"
     )
-    args = parser.parse_args()
+    return parser
+
+
+# === Run Script ===
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    # Treat SIGTERM like Ctrl-C so update_prices still flushes queued updates
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
 
     # Set logging level based on debug flag (only affects this module's logger)
     if args.debug:
@@ -1524,15 +1743,6 @@ if __name__ == "__main__":
         logger.info("Immediate run complete. Exiting.")
     else:
         # Scheduled mode for server
-        def seconds_until_next_utc_interval(interval_hours=4):
-            now = datetime.now(timezone.utc)
-            next_hour = ((now.hour // interval_hours) + 1) * interval_hours
-            if next_hour >= 24:
-                next_time = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-            else:
-                next_time = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
-            return (next_time - now).total_seconds()
-
         interval_hours = 4
         logger.info(f"Scheduled to run every {interval_hours} hours at UTC boundaries (e.g. 00:00, 04:00, ...).")
         try:
@@ -0,0 +1,57 @@
+-- Migration: Server-side selection of products due a price or image update.
+-- Adds public.products_needing_update(), which main.fetch_products_needing_update
+-- calls over RPC instead of sending the six-clause PostgREST or= filter on
+-- every page. The predicate is the same one build_update_or_query() builds;
+-- keep the two in sync, since the scraper falls back to the filter when this
+-- function is missing.
+--
+-- Paging is keyset on products.id and happens INSIDE the function (after_id,
+-- page_size). The search_path pin below stops Postgres inlining the function,
+-- so filters PostgREST appended to the RPC result would run only after the
+-- full set was built; doing the seek here keeps each page a pkey range scan.
+--
+-- products.last_updated is timestamp WITHOUT time zone holding UTC, so the
+-- price cutoff is converted with AT TIME ZONE 'UTC' rather than relying on
+-- the session TimeZone for the implicit cast.
+--
+-- Execute is limited to service_role (the scraper); the anon and
+-- authenticated API roles have no use for it. Idempotent.
+--
+-- Verification:
+--   SELECT proname, proconfig FROM pg_proc
+--    WHERE proname = 'products_needing_update';
+--   SELECT count(*) FROM public.products_needing_update(
+--     now() - interval '23 hours', now() - interval '24 hours', 0, 500);
+
+CREATE OR REPLACE FUNCTION public.products_needing_update(
+  price_cutoff timestamptz,
+  image_cutoff timestamptz,
+  after_id bigint DEFAULT 0,
+  page_size integer DEFAULT 500
+)
+RETURNS SETOF public.products
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT p.*
+  FROM public.products p
+  WHERE p.id > after_id
+    AND (
+      p.last_updated IS NULL
+      OR p.usd_price IS NULL
+      OR p.last_updated < (price_cutoff AT TIME ZONE 'UTC')
+      OR p.image_url IS NULL
+      OR p.last_image_update IS NULL
+      OR p.last_image_update < image_cutoff
+    )
+  ORDER BY p.id
+  LIMIT page_size;
+$$;
+
+ALTER FUNCTION public.products_needing_update(timestamptz, timestamptz, bigint, integer)
+  SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.products_needing_update(timestamptz, timestamptz, bigint, integer)
+  FROM public, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.products_needing_update(timestamptz, timestamptz, bigint, integer)
+  TO service_role;
@@ -0,0 +1,47 @@
+-- Migration: Duplicate-tolerant bulk insert for product_price_history.
+-- Adds public.insert_price_history_skip_duplicates(rows jsonb), which the
+-- scraper calls when a plain batch insert is rejected. The usual cause is a
+-- product that already has a row for today under the unique
+-- (product_id, recorded_at::date) index from 0003; without this the scraper
+-- retried every row of the batch individually.
+--
+-- A PostgREST upsert cannot express this: on_conflict takes a column list,
+-- and the day index is on an expression, so no column list matches it. A
+-- target-less ON CONFLICT DO NOTHING inside SQL arbitrates on every unique
+-- index, the expression one included.
+--
+-- rows is a JSON array of {product_id, usd_price[, recorded_at]}; a missing
+-- recorded_at takes now(), matching the column default. Returns the number
+-- of rows actually inserted (duplicates excluded). Any other error (e.g. the
+-- usd_price > 0 CHECK) still aborts the whole call, and the scraper falls
+-- back to per-row inserts to isolate the offender.
+--
+-- Execute is limited to service_role (the scraper). Idempotent.
+--
+-- Verification:
+--   SELECT proname, proconfig FROM pg_proc
+--    WHERE proname = 'insert_price_history_skip_duplicates';
+
+CREATE OR REPLACE FUNCTION public.insert_price_history_skip_duplicates(rows jsonb)
+RETURNS integer
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH inserted AS (
+    INSERT INTO public.product_price_history (product_id, usd_price, recorded_at)
+    SELECT r.product_id, r.usd_price, COALESCE(r.recorded_at, now())
+    FROM jsonb_to_recordset(rows)
+      AS r(product_id bigint, usd_price double precision, recorded_at timestamp)
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM inserted;
+$$;
+
+ALTER FUNCTION public.insert_price_history_skip_duplicates(jsonb)
+  SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.insert_price_history_skip_duplicates(jsonb)
+  FROM public, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.insert_price_history_skip_duplicates(jsonb)
+  TO service_role;
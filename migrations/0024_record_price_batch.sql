@@ -0,0 +1,66 @@
+-- Migration: Write a batch of scraper results in one round-trip.
+-- Adds public.record_price_batch(rows jsonb), which main.update_prices calls
+-- once per 100 products instead of issuing one products PATCH per product
+-- plus a separate product_price_history insert per batch.
+--
+-- rows is a JSON array of per-product updates:
+--   {product_id, usd_price?, last_updated?, image_url?, last_image_update?}
+-- Omitted (or null) fields leave the column unchanged; the scraper never
+-- writes a NULL into any of them. Rows carrying usd_price also get a
+-- product_price_history row, skipped via target-less ON CONFLICT DO NOTHING
+-- when the product already has one today (same rule as 0023).
+--
+-- last_updated is declared timestamp WITHOUT time zone in the recordset so
+-- the scraper's '...+00:00' strings are read exactly as PostgREST reads them
+-- for that column: the UTC wall time, offset dropped.
+--
+-- Both statements run in the function's single transaction, so a product's
+-- price and its history row land together or not at all; the scraper replays
+-- the batch through the old per-row path if the call fails. Returns the
+-- number of products updated. Each product_id must appear at most once per
+-- call (update_prices visits each product once per run).
+--
+-- Execute is limited to service_role (the scraper). Idempotent.
+--
+-- Verification:
+--   SELECT proname, proconfig FROM pg_proc WHERE proname = 'record_price_batch';
+
+CREATE OR REPLACE FUNCTION public.record_price_batch(rows jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count integer;
+BEGIN
+  INSERT INTO public.product_price_history (product_id, usd_price)
+  SELECT r.product_id, r.usd_price
+  FROM jsonb_to_recordset(rows) AS r(product_id bigint, usd_price double precision)
+  WHERE r.usd_price IS NOT NULL
+  ON CONFLICT DO NOTHING;
+
+  UPDATE public.products p
+  SET usd_price = COALESCE(r.usd_price, p.usd_price),
+      last_updated = COALESCE(r.last_updated, p.last_updated),
+      image_url = COALESCE(r.image_url, p.image_url),
+      last_image_update = COALESCE(r.last_image_update, p.last_image_update)
+  FROM jsonb_to_recordset(rows) AS r(
+    product_id bigint,
+    usd_price double precision,
+    last_updated timestamp,
+    image_url text,
+    last_image_update timestamptz
+  )
+  WHERE p.id = r.product_id;
+
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$;
+
+ALTER FUNCTION public.record_price_batch(jsonb)
+  SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.record_price_batch(jsonb)
+  FROM public, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.record_price_batch(jsonb)
+  TO service_role;
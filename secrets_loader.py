@@ -11,6 +11,11 @@ secrets file. Set the env var on the scraper host instead.
 import os
 from typing import Optional
 
+import httpx
+from supabase import Client, ClientOptions, create_client
+
+SUPABASE_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
 
 def _from_env_or_file(env_name: str, file_attr: str) -> Optional[str]:
     value = os.environ.get(env_name)
@@ -38,6 +43,19 @@ def load_supabase_credentials() -> tuple[str, str]:
     return url, key
 
 
+def create_supabase_client(url: str, key: str, max_connections: int = 10) -> Client:
+    """Build a Supabase client whose sub-clients share one httpx pool.
+
+    supabase-py otherwise gives PostgREST, Storage, etc. a connection pool
+    each; one pool keeps a run on a few keep-alive TLS connections.
+    max_connections caps both open and idle connections.
+    """
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections)
+    http_client = httpx.Client(limits=limits, timeout=SUPABASE_HTTP_TIMEOUT)
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client))
+
+
 def load_shopify_credentials() -> tuple[str, str, str]:
     domain = _from_env_or_file("SHOPIFY_STORE_DOMAIN", "SHOPIFY_STORE_DOMAIN")
     token = _from_env_or_file("SHOPIFY_ADMIN_API_TOKEN", "SHOPIFY_ADMIN_API_TOKEN")
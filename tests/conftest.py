@@ -0,0 +1,77 @@
+"""
+Shared pytest fixtures for the scraper test suite.
+"""
+import shutil
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+UTC = timezone.utc
+
+# Stub the credentials module before any test module imports main or the
+# backfill scripts. This has to happen when conftest is imported, not in a
+# fixture: the test modules import those scripts at collection time, before
+# any fixture runs. Each pytest-xdist worker imports conftest in its own
+# process, so every worker gets its own stub.
+_secrets = ModuleType("secretsFile")
+_secrets.SUPABASE_URL = "https://test.supabase.co"
+_secrets.SUPABASE_KEY = "test-key"
+sys.modules["secretsFile"] = _secrets
+
+
+@pytest.fixture
+def now_utc():
+    """One clock read per test, so every derived window shares a reference.
+
+    Calling datetime.now() separately for "now" and for each offset lets the
+    clock advance between reads, which makes boundary assertions flaky.
+    """
+    return datetime.now(UTC)
+
+
+@pytest.fixture
+def timestamps(now_utc):
+    """Precomputed windows and ISO strings for the update-gate tests.
+
+    ``old_iso`` is 25h before ``now`` and ``recent_iso`` 1h before, so they
+    fall either side of the 24h ``interval_ago`` cutoff.
+    """
+    return SimpleNamespace(
+        now=now_utc,
+        interval_ago=now_utc - timedelta(hours=24),
+        old_iso=(now_utc - timedelta(hours=25)).isoformat(),
+        recent_iso=(now_utc - timedelta(hours=1)).isoformat(),
+    )
+
+
+@pytest.fixture(scope="session")
+def _chrome_profile_template(tmp_path_factory):
+    """A small Chrome-like profile tree, built once per session."""
+    template = tmp_path_factory.mktemp("chrome_profile_tmpl")
+    (template / "Default" / "Cache").mkdir(parents=True)
+    (template / "Default" / "Cache" / "data_0").write_bytes(b"x" * 4096)
+    (template / "Default" / "Cookies").write_bytes(b"x" * 4096)
+    return template
+
+
+@pytest.fixture
+def chrome_dir(_chrome_profile_template, tmp_path):
+    """A fresh copy of the profile template for cleanup_driver to delete.
+
+    Uses a copy-on-write clone where the filesystem supports it (btrfs/xfs)
+    and falls back to a plain copy elsewhere, including macOS, whose cp has
+    no --reflink.
+    """
+    dst = tmp_path / "profile"
+    try:
+        subprocess.run(
+            ["cp", "--reflink=auto", "-r", str(_chrome_profile_template), str(dst)],
+            check=True, capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(_chrome_profile_template, dst)
+    return str(dst)
@@ -15,19 +15,13 @@ Tests cover:
 Run with: python -m pytest tests/test_backfill_enhanced.py -v
 """
 import argparse
-import sys
 import json
 import tempfile
 import os
 from datetime import datetime, timedelta, timezone
-from unittest.mock import MagicMock, patch, mock_open, call
+from unittest.mock import patch, mock_open, call
 import pytest
 
-# Mock external dependencies
-sys.modules['secretsFile'] = MagicMock()
-sys.modules['secretsFile'].SUPABASE_URL = 'https://test.supabase.co'
-sys.modules['secretsFile'].SUPABASE_KEY = 'test-key'
-
 
 # === Checkpoint Manager Tests ===
 class TestCheckpointManager:
@@ -60,6 +54,21 @@ class TestCheckpointManager:
         assert 3 in checkpoint.data['failed_products']
         assert checkpoint.data['stats']['total_inserted'] == 100
 
+    def test_checkpoint_save_round_trips(self, tmp_path):
+        """A saved checkpoint should reload with the same contents"""
+        from backfill_historical_prices import CheckpointManager
+
+        path = str(tmp_path / "checkpoint.json")
+        checkpoint = CheckpointManager(path)
+        checkpoint.mark_processed(1)
+        checkpoint.mark_failed(2)
+        checkpoint.update_stats(inserted=10, skipped=1)
+
+        reloaded = CheckpointManager(path)
+
+        assert reloaded.data == checkpoint.data
+        assert reloaded.data['stats']['total_inserted'] == 10
+
     @patch('builtins.open', new_callable=mock_open)
     @patch('os.path.exists', return_value=False)
     def test_checkpoint_mark_processed(self, mock_exists, mock_file):
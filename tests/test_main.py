@@ -11,15 +11,10 @@ These tests cover:
 
 Run with: python -m pytest tests/test_main.py -v
 """
-import sys
 from datetime import datetime, timedelta, timezone
-from unittest.mock import MagicMock, patch, PropertyMock
 import pytest
 
-# Mock external dependencies before importing main
-sys.modules['secretsFile'] = MagicMock()
-sys.modules['secretsFile'].SUPABASE_URL = 'https://test.supabase.co'
-sys.modules['secretsFile'].SUPABASE_KEY = 'test-key'
+UTC = timezone.utc
 
 
 class TestParseTimestamp:
@@ -57,7 +52,7 @@ class TestParseTimestamp:
         result = parse_timestamp("2024-12-15T10:30:00")
 
         assert result is not None
-        assert result.tzinfo == timezone.utc
+        assert result.tzinfo == UTC
 
     def test_parse_timestamp_with_none(self):
         """Should return None for None input"""
@@ -84,72 +79,80 @@ class TestParseTimestamp:
         assert result is None
 
 
-class TestSecondsUntilNextInterval:
-    """Tests for seconds_until_next_utc_interval function logic"""
+class TestSupabaseClient:
+    """Tests for the process-wide Supabase client"""
 
-    def test_calculate_next_4hour_interval_from_midnight(self):
-        """From 00:00, next interval should be 04:00"""
-        now = datetime(2024, 12, 15, 0, 0, 0, tzinfo=timezone.utc)
-        interval_hours = 4
+    def test_sub_clients_share_one_pool(self):
+        """PostgREST and Storage should go through the same httpx client"""
+        import main
 
-        next_hour = ((now.hour // interval_hours) + 1) * interval_hours
-        if next_hour >= 24:
-            next_time = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            next_time = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
+        pool = main.supabase.options.httpx_client
+        assert pool is not None
+        assert main.supabase.postgrest.session is pool
+        assert main.supabase.storage.session is pool
 
-        seconds = (next_time - now).total_seconds()
 
-        assert seconds == 4 * 3600  # 4 hours
+class TestParseTimestampCaching:
+    """Tests for parse_timestamp memoization"""
 
-    def test_calculate_next_4hour_interval_from_3am(self):
-        """From 03:00, next interval should be 04:00"""
-        now = datetime(2024, 12, 15, 3, 0, 0, tzinfo=timezone.utc)
-        interval_hours = 4
+    def test_repeated_timestamp_hits_cache(self):
+        """Should serve a repeated string from the cache"""
+        from main import parse_timestamp
 
-        next_hour = ((now.hour // interval_hours) + 1) * interval_hours
-        next_time = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
+        parse_timestamp.cache_clear()
+        first = parse_timestamp("2024-12-15T10:30:00+00:00")
+        hits_before = parse_timestamp.cache_info().hits
+        second = parse_timestamp("2024-12-15T10:30:00+00:00")
 
-        seconds = (next_time - now).total_seconds()
+        assert parse_timestamp.cache_info().hits == hits_before + 1
+        assert second == first
 
-        assert seconds == 1 * 3600  # 1 hour
+    def test_cache_clear_resets_cache(self):
+        """Should empty the cache on cache_clear()"""
+        from main import parse_timestamp
 
-    def test_calculate_next_4hour_interval_from_4am(self):
-        """From 04:00, next interval should be 08:00"""
-        now = datetime(2024, 12, 15, 4, 0, 0, tzinfo=timezone.utc)
-        interval_hours = 4
+        parse_timestamp("2024-12-15T10:30:00Z")
+        parse_timestamp.cache_clear()
 
-        next_hour = ((now.hour // interval_hours) + 1) * interval_hours
-        next_time = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
+        info = parse_timestamp.cache_info()
+        assert info.currsize == 0
+        assert info.hits == 0
+
+
+class TestSecondsUntilNextInterval:
+    """Tests for seconds_until_next_utc_interval"""
 
-        seconds = (next_time - now).total_seconds()
+    @pytest.mark.parametrize("hour,expected_seconds", [
+        (0, 4 * 3600),   # 00:00 -> 04:00
+        (3, 1 * 3600),   # 03:00 -> 04:00
+        (4, 4 * 3600),   # 04:00 -> 08:00
+        (23, 1 * 3600),  # 23:00 -> 00:00 next day
+    ])
+    def test_next_4h_interval(self, hour, expected_seconds):
+        """Should land on the next 4-hour UTC boundary, rolling past midnight"""
+        from main import seconds_until_next_utc_interval
 
-        assert seconds == 4 * 3600  # 4 hours
+        now = datetime(2024, 12, 15, hour, tzinfo=UTC)
 
-    def test_calculate_next_4hour_interval_from_23pm(self):
-        """From 23:00, next interval should be 00:00 next day"""
-        now = datetime(2024, 12, 15, 23, 0, 0, tzinfo=timezone.utc)
-        interval_hours = 4
+        assert seconds_until_next_utc_interval(4, now=now) == expected_seconds
 
-        next_hour = ((now.hour // interval_hours) + 1) * interval_hours
-        if next_hour >= 24:
-            next_time = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            next_time = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
+    def test_next_interval_ignores_minutes(self):
+        """Should count down from mid-hour to the boundary"""
+        from main import seconds_until_next_utc_interval
 
-        seconds = (next_time - now).total_seconds()
+        now = datetime(2024, 12, 31, 22, 30, tzinfo=UTC)
 
-        assert seconds == 1 * 3600  # 1 hour
+        assert seconds_until_next_utc_interval(4, now=now) == 1.5 * 3600
 
 
 class TestPriceUpdateIntervalLogic:
     """Tests for price update interval logic"""
 
-    def test_needs_update_when_last_updated_is_none(self):
+    def test_needs_update_when_last_updated_is_none(self, now_utc):
         """Should need update when last_updated is None"""
         current_price = 100.0
         last_updated = None
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+        price_interval_ago = now_utc - timedelta(hours=24)
 
         needs_price_update = True
         if current_price is not None and last_updated:
@@ -158,10 +161,10 @@ class TestPriceUpdateIntervalLogic:
 
         assert needs_price_update is True
 
-    def test_needs_update_when_price_is_none(self):
+    def test_needs_update_when_price_is_none(self, now_utc):
         """Should need update when current price is None"""
         current_price = None
-        last_updated = datetime.now(timezone.utc).isoformat()
+        last_updated = now_utc.isoformat()
 
         needs_price_update = True
         if current_price is not None and last_updated:
@@ -169,18 +172,14 @@ class TestPriceUpdateIntervalLogic:
 
         assert needs_price_update is True
 
-    def test_needs_update_when_last_updated_is_old(self):
+    def test_needs_update_when_last_updated_is_old(self, timestamps):
         """Should need update when last_updated is older than interval"""
         from main import parse_timestamp
 
-        price_interval_hours = 24
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=price_interval_hours)
-
-        # Create a timestamp that's 25 hours old
-        old_timestamp = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+        price_interval_ago = timestamps.interval_ago
 
         current_price = 100.0
-        last_updated = old_timestamp
+        last_updated = timestamps.old_iso
 
         needs_price_update = True
         if current_price is not None and last_updated:
@@ -190,18 +189,14 @@ class TestPriceUpdateIntervalLogic:
 
         assert needs_price_update is True
 
-    def test_no_update_needed_when_recently_updated(self):
+    def test_no_update_needed_when_recently_updated(self, timestamps):
         """Should not need update when recently updated"""
         from main import parse_timestamp
 
-        price_interval_hours = 24
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=price_interval_hours)
-
-        # Create a timestamp that's 1 hour old
-        recent_timestamp = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+        price_interval_ago = timestamps.interval_ago
 
         current_price = 100.0
-        last_updated = recent_timestamp
+        last_updated = timestamps.recent_iso
 
         needs_price_update = True
         if current_price is not None and last_updated:
@@ -215,11 +210,11 @@ class TestPriceUpdateIntervalLogic:
 class TestImageUpdateLogic:
     """Tests for image update logic"""
 
-    def test_needs_image_update_when_no_current_image(self):
+    def test_needs_image_update_when_no_current_image(self, now_utc):
         """Should need image update when current_image_url is None"""
         current_image_url = None
         last_image_update = None
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+        twenty_four_hours_ago = now_utc - timedelta(hours=24)
 
         needs_image_update = True
         if current_image_url and last_image_update:
@@ -228,15 +223,14 @@ class TestImageUpdateLogic:
 
         assert needs_image_update is True
 
-    def test_needs_image_update_when_last_update_is_old(self):
+    def test_needs_image_update_when_last_update_is_old(self, timestamps):
         """Should need image update when last_image_update is older than 24 hours"""
         from main import parse_timestamp
 
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        old_timestamp = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+        twenty_four_hours_ago = timestamps.interval_ago
 
         current_image_url = "https://example.com/image.jpg"
-        last_image_update = old_timestamp
+        last_image_update = timestamps.old_iso
 
         needs_image_update = True
         if current_image_url and last_image_update:
@@ -246,15 +240,14 @@ class TestImageUpdateLogic:
 
         assert needs_image_update is True
 
-    def test_no_image_update_when_recently_updated(self):
+    def test_no_image_update_when_recently_updated(self, timestamps):
         """Should not need image update when recently updated"""
         from main import parse_timestamp
 
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        recent_timestamp = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+        twenty_four_hours_ago = timestamps.interval_ago
 
         current_image_url = "https://example.com/image.jpg"
-        last_image_update = recent_timestamp
+        last_image_update = timestamps.recent_iso
 
         needs_image_update = True
         if current_image_url and last_image_update:
@@ -270,15 +263,31 @@ class TestSupabaseORQuery:
 
     def test_or_query_format(self):
         """Should construct correct OR query for updates"""
-        price_interval_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
-        twenty_four_hours_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
+        from main import build_update_or_query
+
+        price_interval_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=UTC)
+        twenty_four_hours_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=UTC)
+
+        or_query = build_update_or_query(price_interval_ago, twenty_four_hours_ago)
+
+        assert or_query == (
+            "last_updated.is.null,usd_price.is.null,"
+            "last_updated.lt.2024-12-15T10:00:00+00:00,"
+            "image_url.is.null,last_image_update.is.null,"
+            "last_image_update.lt.2024-12-15T10:00:00+00:00"
+        )
+
+    def test_or_query_uses_separate_cutoffs(self):
+        """Price and image cutoffs should each land in their own clause"""
+        from main import build_update_or_query
 
-        or_query = f"last_updated.is.null,usd_price.is.null,last_updated.lt.{price_interval_ago.isoformat()},image_url.is.null,last_image_update.is.null,last_image_update.lt.{twenty_four_hours_ago.isoformat()}"
+        price_interval_ago = datetime(2024, 12, 15, 11, 0, 0, tzinfo=UTC)
+        twenty_four_hours_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=UTC)
 
-        assert "last_updated.is.null" in or_query
-        assert "usd_price.is.null" in or_query
-        assert "image_url.is.null" in or_query
-        assert "last_image_update.is.null" in or_query
+        or_query = build_update_or_query(price_interval_ago, twenty_four_hours_ago)
+
+        assert "last_updated.lt.2024-12-15T11:00:00+00:00" in or_query
+        assert "last_image_update.lt.2024-12-15T10:00:00+00:00" in or_query
 
 
 class TestImageURLParsing:
@@ -286,31 +295,50 @@ class TestImageURLParsing:
 
     def test_skip_logo_images(self):
         """Should skip logo images"""
+        from main import _SKIP_RE
+
         src = "https://example.com/logo.png"
-        skip_keywords = ['logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card']
 
-        should_skip = any(skip in src.lower() for skip in skip_keywords)
+        should_skip = bool(_SKIP_RE.search(src))
 
         assert should_skip is True
 
     def test_skip_icon_images(self):
         """Should skip icon images"""
+        from main import _SKIP_RE
+
         src = "https://example.com/icon-menu.png"
-        skip_keywords = ['logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card']
 
-        should_skip = any(skip in src.lower() for skip in skip_keywords)
+        should_skip = bool(_SKIP_RE.search(src))
 
         assert should_skip is True
 
     def test_allow_product_images(self):
         """Should allow product images"""
+        from main import _SKIP_RE
+
         src = "https://tcgplayer-cdn.tcgplayer.com/product/12345/image.jpg"
-        skip_keywords = ['logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card']
 
-        should_skip = any(skip in src.lower() for skip in skip_keywords)
+        should_skip = bool(_SKIP_RE.search(src))
 
         assert should_skip is False
 
+    @pytest.mark.parametrize("keyword", ['logo', 'icon', 'avatar', 'banner', 'header', 'footer', 'nav', 'gift-card'])
+    def test_skip_regex_covers_every_keyword(self, keyword):
+        """Should skip a URL containing any configured keyword"""
+        from main import _SKIP_KEYWORDS, _SKIP_RE
+
+        assert keyword in _SKIP_KEYWORDS
+        assert _SKIP_RE.search(f"https://example.com/img/{keyword}.png")
+
+    def test_skip_is_case_insensitive(self):
+        """Should skip keywords regardless of URL casing"""
+        from main import _SKIP_RE
+
+        src = "https://example.com/assets/Site-LOGO.PNG"
+
+        assert bool(_SKIP_RE.search(src)) is True
+
     def test_detect_tcgplayer_cdn_images(self):
         """Should detect TCGPlayer CDN images"""
         src = "https://tcgplayer-cdn.tcgplayer.com/product/12345/image.jpg"
@@ -325,50 +353,37 @@ class TestSrcsetParsing:
 
     def test_parse_srcset_gets_highest_width(self):
         """Should parse srcset and return highest resolution URL"""
+        from main import _parse_srcset
+
         srcset = "https://cdn.example.com/small.jpg 320w, https://cdn.example.com/medium.jpg 640w, https://cdn.example.com/large.jpg 1280w"
 
-        srcset_entries = srcset.split(',')
-        best_src = None
-        best_width = 0
-
-        for entry in srcset_entries:
-            entry = entry.strip()
-            if ' ' in entry:
-                url_part, width_part = entry.rsplit(' ', 1)
-                try:
-                    width = int(width_part.replace('w', ''))
-                    if width > best_width:
-                        best_width = width
-                        best_src = url_part
-                except ValueError:
-                    continue
+        best_src, best_width = _parse_srcset(srcset)
 
         assert best_width == 1280
         assert best_src == "https://cdn.example.com/large.jpg"
 
     def test_parse_srcset_with_no_widths(self):
         """Should handle srcset with no width descriptors"""
+        from main import _parse_srcset
+
         srcset = "https://cdn.example.com/image.jpg"
 
-        srcset_entries = srcset.split(',')
-        best_src = None
-        best_width = 0
-
-        for entry in srcset_entries:
-            entry = entry.strip()
-            if ' ' in entry:
-                url_part, width_part = entry.rsplit(' ', 1)
-                try:
-                    width = int(width_part.replace('w', ''))
-                    if width > best_width:
-                        best_width = width
-                        best_src = url_part
-                except ValueError:
-                    continue
+        best_src, best_width = _parse_srcset(srcset)
 
         assert best_width == 0
         assert best_src is None
 
+    def test_parse_srcset_ignores_density_descriptors(self):
+        """Should skip 2x-style candidates and handle missing spaces after commas"""
+        from main import _parse_srcset
+
+        srcset = "https://cdn.example.com/a.jpg 2x,https://cdn.example.com/b.jpg 480w"
+
+        best_src, best_width = _parse_srcset(srcset)
+
+        assert best_width == 480
+        assert best_src == "https://cdn.example.com/b.jpg"
+
 
 class TestFileExtensionExtraction:
     """Tests for image file extension extraction"""
@@ -377,7 +392,7 @@ class TestFileExtensionExtraction:
         """Should extract jpg extension"""
         image_url = "https://example.com/image.jpg"
 
-        file_extension = image_url.split('.')[-1].split('?')[0].lower()
+        file_extension = image_url.rpartition('.')[2].partition('?')[0].lower()
 
         assert file_extension == "jpg"
 
@@ -385,17 +400,18 @@ class TestFileExtensionExtraction:
         """Should extract extension ignoring query string"""
         image_url = "https://example.com/image.png?v=123"
 
-        file_extension = image_url.split('.')[-1].split('?')[0].lower()
+        file_extension = image_url.rpartition('.')[2].partition('?')[0].lower()
 
         assert file_extension == "png"
 
     def test_fallback_for_invalid_extension(self):
         """Should fallback to jpg for invalid extensions"""
+        from main import IMAGE_ALLOWED_EXTS
+
         image_url = "https://example.com/image"
-        valid_extensions = ['jpg', 'jpeg', 'png', 'webp']
 
-        file_extension = image_url.split('.')[-1].split('?')[0].lower()
-        if file_extension not in valid_extensions:
+        file_extension = image_url.rpartition('.')[2].partition('?')[0].lower()
+        if file_extension not in IMAGE_ALLOWED_EXTS:
             file_extension = 'jpg'
 
         assert file_extension == "jpg"
@@ -406,9 +422,11 @@ class TestPriceExtraction:
 
     def test_price_parsing_with_dollar_and_comma(self):
         """Should parse price with $ and commas"""
+        from main import _PRICE_STRIP
+
         price_text = "$1,234.56"
 
-        price = float(price_text.replace("$", "").replace(",", ""))
+        price = float(price_text.translate(_PRICE_STRIP))
 
         assert price == 1234.56
 
@@ -433,63 +451,64 @@ class TestCLIArgumentParsing:
 
     def test_run_now_flag(self):
         """Should parse --run-now flag"""
-        import argparse
-
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--run-now", action="store_true")
+        import main
 
-        args = parser.parse_args(["--run-now"])
+        args = main.get_parser().parse_args(["--run-now"])
 
         assert args.run_now is True
 
     def test_default_no_run_now(self):
         """Should default to scheduled mode"""
-        import argparse
-
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--run-now", action="store_true")
+        import main
 
-        args = parser.parse_args([])
+        args = main.get_parser().parse_args([])
 
         assert args.run_now is False
+        assert args.debug is False
+
+    def test_parser_is_cached(self):
+        """Should hand back the same parser instance on every call"""
+        import main
+
+        assert main.get_parser() is main.get_parser()
 
 
 class TestUpdateDataConstruction:
     """Tests for update data dictionary construction"""
 
-    def test_construct_update_with_price_only(self):
+    def test_construct_update_with_price_only(self, now_utc):
         """Should construct update data with price only"""
         update_data = {}
         price = 150.0
 
         update_data["usd_price"] = price
-        update_data["last_updated"] = datetime.now(timezone.utc).isoformat()
+        update_data["last_updated"] = now_utc.isoformat()
 
         assert "usd_price" in update_data
         assert update_data["usd_price"] == 150.0
         assert "last_updated" in update_data
 
-    def test_construct_update_with_image_only(self):
+    def test_construct_update_with_image_only(self, now_utc):
         """Should construct update data with image only"""
         update_data = {}
         uploaded_image_url = "https://supabase.storage/image.jpg"
 
         update_data["image_url"] = uploaded_image_url
-        update_data["last_image_update"] = datetime.now(timezone.utc).isoformat()
+        update_data["last_image_update"] = now_utc.isoformat()
 
         assert "image_url" in update_data
         assert "last_image_update" in update_data
 
-    def test_construct_update_with_both(self):
+    def test_construct_update_with_both(self, now_utc):
         """Should construct update data with both price and image"""
         update_data = {}
         price = 150.0
         uploaded_image_url = "https://supabase.storage/image.jpg"
 
         update_data["usd_price"] = price
-        update_data["last_updated"] = datetime.now(timezone.utc).isoformat()
+        update_data["last_updated"] = now_utc.isoformat()
         update_data["image_url"] = uploaded_image_url
-        update_data["last_image_update"] = datetime.now(timezone.utc).isoformat()
+        update_data["last_image_update"] = now_utc.isoformat()
 
         assert len(update_data) == 4
 
@@ -506,58 +525,56 @@ class TestProductGrouping:
             {"id": 4, "set_id": 2, "product_type_id": 1, "variant": "Promo"},
         ]
 
-        products_by_type = {}
-        for product in products:
-            key = f"Set:{product['set_id']}-Type:{product['product_type_id']}"
-            if product.get('variant'):
-                key += f"-Variant:{product['variant']}"
-            if key not in products_by_type:
-                products_by_type[key] = 0
-            products_by_type[key] += 1
+        from main import group_products_by_type
 
-        assert products_by_type["Set:1-Type:1"] == 2
-        assert products_by_type["Set:1-Type:2"] == 1
-        assert products_by_type["Set:2-Type:1-Variant:Promo"] == 1
+        products_by_type = group_products_by_type(products)
 
+        assert products_by_type[(1, 1, None)] == 2
+        assert products_by_type[(1, 2, None)] == 1
+        assert products_by_type[(2, 1, "Promo")] == 1
+        assert len(products_by_type) == 3
 
-class TestImageSizeValidation:
-    """Tests for image size validation"""
+    def test_empty_variant_groups_with_none(self):
+        """An empty-string variant should share the no-variant group"""
+        from main import group_products_by_type
 
-    def test_reject_too_small_image(self):
-        """Should reject images smaller than 1000 bytes"""
-        content_length = 500
+        products = [
+            {"id": 1, "set_id": 1, "product_type_id": 1, "variant": ""},
+            {"id": 2, "set_id": 1, "product_type_id": 1},
+        ]
 
-        is_valid = content_length >= 1000
+        assert dict(group_products_by_type(products)) == {(1, 1, None): 2}
 
-        assert is_valid is False
 
-    def test_accept_valid_size_image(self):
-        """Should accept images larger than 1000 bytes"""
-        content_length = 5000
+class TestImageSizeValidation:
+    """Tests for image size validation"""
 
+    @pytest.mark.parametrize("content_length, expected", [
+        (500, False),
+        (999, False),
+        (1000, True),
+        (5000, True),
+    ])
+    def test_image_size_threshold(self, content_length, expected):
+        """Should accept images of at least 1000 bytes and reject smaller ones"""
         is_valid = content_length >= 1000
 
-        assert is_valid is True
+        assert is_valid is expected
 
 
 class TestVariantInfoDisplay:
     """Tests for variant info display"""
 
-    def test_variant_info_when_present(self):
-        """Should show variant info when variant exists"""
-        variant = "Pokemon Center"
-
+    @pytest.mark.parametrize("variant, expected", [
+        ("Pokemon Center", " (Variant: Pokemon Center)"),
+        (None, ""),
+        ("", ""),
+    ])
+    def test_variant_info(self, variant, expected):
+        """Should show variant info only when a variant exists"""
         variant_info = f" (Variant: {variant})" if variant else ""
 
-        assert variant_info == " (Variant: Pokemon Center)"
-
-    def test_variant_info_when_absent(self):
-        """Should show empty string when no variant"""
-        variant = None
-
-        variant_info = f" (Variant: {variant})" if variant else ""
-
-        assert variant_info == ""
+        assert variant_info == expected
 
 
 class TestEdgeCases:
@@ -571,25 +588,19 @@ class TestEdgeCases:
 
         assert should_skip is True
 
-    def test_scraped_data_with_none_values(self):
-        """Should handle scraped data with None values"""
-        scraped_data = {'price': None, 'image_url': None}
-
-        price = scraped_data.get('price')
-        tcg_image_url = scraped_data.get('image_url')
+    @pytest.mark.parametrize("raw_price, expected", [
+        (None, None),
+        (0, None),
+        (0.0, None),
+        (-1.5, None),
+        (0.01, 0.01),
+        (12.5, 12.5),
+    ])
+    def test_normalize_scraped_price(self, raw_price, expected):
+        """Should keep positive scraped prices and drop missing or non-positive ones"""
+        from main import _normalize_scraped_price
 
-        assert price is None
-        assert tcg_image_url is None
-    
-    def test_scraped_data_with_non_positive_price(self):
-        """Should ignore non-positive scraped prices"""
-        scraped_data = {'price': 0, 'image_url': None}
-
-        price = scraped_data.get('price')
-        if price is not None and price <= 0:
-            price = None
-
-        assert price is None
+        assert _normalize_scraped_price(raw_price) == expected
 
     def test_same_image_url_detection(self):
         """Should detect when image URL is unchanged"""
@@ -606,12 +617,14 @@ class TestExchangeRateParsing:
 
     def test_parse_boc_date_format(self):
         """Should parse Bank of Canada date format"""
+        from main import _DASH_TRANS
+
         # BOC uses en-dash (unicode \u2011) not regular hyphen
         rate_date_str = "2024\u201112\u201115"  # 2024-12-15 with en-dash
 
         # Replace en-dash with regular hyphen for parsing
-        normalized = rate_date_str.replace('\u2011', '-')
-        rate_date = datetime.strptime(normalized, "%Y-%m-%d")
+        normalized = rate_date_str.translate(_DASH_TRANS)
+        rate_date = datetime.fromisoformat(normalized)
 
         assert rate_date.year == 2024
         assert rate_date.month == 12
@@ -692,8 +705,8 @@ class TestNoScrapeTimeDrift:
                 break
 
         # 00:30 start is the case that breaks a 22h gate on hourly cron.
-        for start in (datetime(2026, 8, 1, 0, 30, tzinfo=timezone.utc),
-                      datetime(2026, 8, 1, 8, 3, tzinfo=timezone.utc)):
+        for start in (datetime(2026, 8, 1, 0, 30, tzinfo=UTC),
+                      datetime(2026, 8, 1, 8, 3, tzinfo=UTC)):
             for run_every in self.CANDIDATE_RUN_INTERVALS_HOURS:
                 scraped = self._simulate(interval, run_every, start)
                 assert len(scraped) == len(set(scraped)), (
@@ -709,7 +722,7 @@ class TestNoScrapeTimeDrift:
     def test_22h_gate_would_double_scrape_on_hourly_cron(self):
         """Witness for why the gate is 23 and not 22: 22 is safe on the live
         4-hourly cron but breaks on the hourly cadence the README documents."""
-        start = datetime(2026, 8, 1, 0, 30, tzinfo=timezone.utc)
+        start = datetime(2026, 8, 1, 0, 30, tzinfo=UTC)
 
         four_hourly = self._simulate(22, 4, start)
         assert len(four_hourly) == len(set(four_hourly)), "22h is fine at 4h cadence"
@@ -722,7 +735,7 @@ class TestNoScrapeTimeDrift:
 
     def test_24h_window_reproduces_the_original_drift(self):
         """Regression witness: the old value skips calendar days."""
-        start = datetime(2026, 8, 1, 8, 3, tzinfo=timezone.utc)
+        start = datetime(2026, 8, 1, 8, 3, tzinfo=UTC)
         scrape_days = self._simulate(24, 4, start)
 
         gaps = [(b - a).days for a, b in zip(scrape_days, scrape_days[1:])]
@@ -11,34 +11,93 @@ These tests cover:
 
 Run with: python -m pytest tests/test_new_functions.py -v
 """
-import sys
 import os
-import tempfile
+import json
 import shutil
-from datetime import datetime, timedelta, timezone
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch, call
+import httpx
 import pytest
+from postgrest import SyncRequestBuilder
+from supabase import Client
 
-# Mock external dependencies before importing modules
-sys.modules['secretsFile'] = MagicMock()
-sys.modules['secretsFile'].SUPABASE_URL = 'https://test.supabase.co'
-sys.modules['secretsFile'].SUPABASE_KEY = 'test-key'
+import backfill_historical_prices
+import main
+import secretsFile
+from main import (
+    _flush_price_history_batch,
+    _flush_product_updates,
+    cleanup_driver,
+    fetch_products_needing_update,
+)
+from backfill_historical_prices import (
+    batch_insert_price_history,
+    fetch_products_paginated,
+    iter_products_paginated,
+)
+
+# PostgREST base for the stub credentials. Tests taking respx_mock run the real
+# Supabase client against canned HTTP responses instead of a MagicMock chain.
+REST_URL = f"{secretsFile.SUPABASE_URL}/rest/v1"
+
+
+@pytest.fixture
+def supabase_mock():
+    """A Supabase client mock limited to the real Client and request-builder API.
+
+    A misspelled or removed method raises AttributeError instead of quietly
+    returning another MagicMock.
+    """
+    client = MagicMock(spec=Client)
+    client.table.return_value = MagicMock(spec=SyncRequestBuilder)
+    return client
+
+
+@pytest.fixture
+def main_supabase(supabase_mock, monkeypatch):
+    """supabase_mock installed as main.supabase for one test."""
+    monkeypatch.setattr(main, "supabase", supabase_mock)
+    return supabase_mock
+
+
+@pytest.fixture
+def backfill_supabase(supabase_mock, monkeypatch):
+    """supabase_mock installed as backfill_historical_prices.supabase for one test."""
+    monkeypatch.setattr(backfill_historical_prices, "supabase", supabase_mock)
+    return supabase_mock
+
+
+def side_effect_sequence(*outcomes):
+    """Mock side_effect that raises exception outcomes and returns the rest, in order.
+
+    The Supabase calls under test ignore execute()'s return value, so plain
+    placeholders stand in for responses instead of one MagicMock per call.
+    """
+    it = iter(outcomes)
+
+    def _effect(*args, **kwargs):
+        outcome = next(it)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return _effect
 
 
 class TestCleanupDriverMain:
     """Tests for cleanup_driver function in main.py"""
 
-    def test_cleanup_driver_quits_driver_and_removes_directory(self):
+    def test_cleanup_driver_quits_driver_and_removes_directory(self, chrome_dir):
         """Should quit driver and remove temp directory"""
-        from main import cleanup_driver
-
         # Create a mock driver
         mock_driver = MagicMock()
 
-        # Create a real temp directory
-        temp_dir = tempfile.mkdtemp(prefix="test_chrome_")
+        temp_dir = chrome_dir
 
-        cleanup_driver(mock_driver, temp_dir)
+        cleanup_driver(mock_driver, temp_dir).result()
 
         # Verify driver.quit() was called
         mock_driver.quit.assert_called_once()
@@ -46,42 +105,33 @@ class TestCleanupDriverMain:
         # Verify temp directory was removed
         assert not os.path.exists(temp_dir)
 
-    def test_cleanup_driver_handles_none_driver(self):
+    def test_cleanup_driver_handles_none_driver(self, chrome_dir):
         """Should handle None driver gracefully"""
-        from main import cleanup_driver
-
-        # Create a real temp directory
-        temp_dir = tempfile.mkdtemp(prefix="test_chrome_")
+        temp_dir = chrome_dir
 
         # Should not raise exception
-        cleanup_driver(None, temp_dir)
+        cleanup_driver(None, temp_dir).result()
 
         # Verify temp directory was still removed
         assert not os.path.exists(temp_dir)
 
     def test_cleanup_driver_handles_none_user_data_dir(self):
         """Should handle None user_data_dir gracefully"""
-        from main import cleanup_driver
-
         mock_driver = MagicMock()
 
-        # Should not raise exception
-        cleanup_driver(mock_driver, None)
+        # Should not raise exception; nothing to delete, so no future
+        assert cleanup_driver(mock_driver, None) is None
 
         # Verify driver.quit() was called
         mock_driver.quit.assert_called_once()
 
     def test_cleanup_driver_handles_both_none(self):
         """Should handle both driver and user_data_dir being None"""
-        from main import cleanup_driver
-
         # Should not raise exception
         cleanup_driver(None, None)
 
     def test_cleanup_driver_handles_nonexistent_directory(self):
         """Should handle non-existent directory gracefully"""
-        from main import cleanup_driver
-
         mock_driver = MagicMock()
         nonexistent_dir = "/tmp/definitely_does_not_exist_12345"
 
@@ -90,21 +140,19 @@ class TestCleanupDriverMain:
             shutil.rmtree(nonexistent_dir)
 
         # Should not raise exception
-        cleanup_driver(mock_driver, nonexistent_dir)
+        assert cleanup_driver(mock_driver, nonexistent_dir) is None
 
         mock_driver.quit.assert_called_once()
 
-    def test_cleanup_driver_handles_driver_quit_exception(self):
+    def test_cleanup_driver_handles_driver_quit_exception(self, chrome_dir):
         """Should handle exception when driver.quit() fails"""
-        from main import cleanup_driver
-
         mock_driver = MagicMock()
         mock_driver.quit.side_effect = Exception("Driver quit failed")
 
-        temp_dir = tempfile.mkdtemp(prefix="test_chrome_")
+        temp_dir = chrome_dir
 
         # Should not raise exception
-        cleanup_driver(mock_driver, temp_dir)
+        cleanup_driver(mock_driver, temp_dir).result()
 
         # Temp directory should still be cleaned up
         assert not os.path.exists(temp_dir)
@@ -119,26 +167,23 @@ class TestCleanupDriverMain:
 class TestFetchProductsPaginated:
     """Tests for fetch_products_paginated function in backfill_historical_prices.py"""
 
-    @patch('backfill_historical_prices.supabase')
-    def test_fetch_products_paginated_single_batch(self, mock_supabase):
+    def test_fetch_products_paginated_single_batch(self, respx_mock):
         """Should fetch all products in single batch when less than batch_size"""
-        # Setup mock
-        mock_response = MagicMock()
-        mock_response.data = [
+        route = respx_mock.get(f"{REST_URL}/products").mock(return_value=httpx.Response(200, json=[
             {"id": 1, "url": "https://example.com/1"},
             {"id": 2, "url": "https://example.com/2"},
-        ]
-        mock_supabase.table.return_value.select.return_value.range.return_value.execute.return_value = mock_response
-
-        from backfill_historical_prices import fetch_products_paginated
+        ]))
 
         result = fetch_products_paginated(batch_size=500)
 
         assert len(result) == 2
         assert result[0]["id"] == 1
+        params = route.calls.last.request.url.params
+        assert params["id"] == "gt.0"
+        assert params["order"] == "id.asc"
+        assert params["limit"] == "500"
 
-    @patch('backfill_historical_prices.supabase')
-    def test_fetch_products_paginated_multiple_batches(self, mock_supabase):
+    def test_fetch_products_paginated_multiple_batches(self, backfill_supabase):
         """Should paginate through multiple batches"""
         # First batch - full
         batch1 = [{"id": i} for i in range(1, 11)]  # 10 items
@@ -146,9 +191,7 @@ class TestFetchProductsPaginated:
         batch2 = [{"id": i} for i in range(11, 16)]  # 5 items
 
         responses = [MagicMock(data=batch1), MagicMock(data=batch2)]
-        mock_supabase.table.return_value.select.return_value.range.return_value.execute.side_effect = responses
-
-        from backfill_historical_prices import fetch_products_paginated
+        backfill_supabase.table.return_value.select.return_value.gt.return_value.order.return_value.limit.return_value.execute.side_effect = responses
 
         result = fetch_products_paginated(batch_size=10)
 
@@ -156,36 +199,64 @@ class TestFetchProductsPaginated:
         assert result[0]["id"] == 1
         assert result[-1]["id"] == 15
 
-    @patch('backfill_historical_prices.supabase')
-    def test_fetch_products_paginated_empty_response(self, mock_supabase):
+    def test_fetch_products_paginated_empty_response(self, backfill_supabase):
         """Should handle empty response"""
         mock_response = MagicMock()
         mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.range.return_value.execute.return_value = mock_response
-
-        from backfill_historical_prices import fetch_products_paginated
+        backfill_supabase.table.return_value.select.return_value.gt.return_value.order.return_value.limit.return_value.execute.return_value = mock_response
 
         result = fetch_products_paginated()
 
         assert result == []
 
-    @patch('backfill_historical_prices.supabase')
-    def test_fetch_products_paginated_custom_batch_size(self, mock_supabase):
+    def test_fetch_products_paginated_custom_batch_size(self, backfill_supabase):
         """Should use custom batch size"""
         mock_response = MagicMock()
         mock_response.data = [{"id": 1}]
-        mock_chain = mock_supabase.table.return_value.select.return_value.range.return_value
+        mock_chain = backfill_supabase.table.return_value.select.return_value.gt.return_value.order.return_value.limit.return_value
         mock_chain.execute.return_value = mock_response
 
-        from backfill_historical_prices import fetch_products_paginated
-
         fetch_products_paginated(batch_size=100)
 
-        # Verify range was called with correct parameters (0, 99 for batch_size=100)
-        mock_supabase.table.return_value.select.return_value.range.assert_called_with(0, 99)
+        # First page seeks from id 0, ordered by id, capped at batch_size
+        select = backfill_supabase.table.return_value.select.return_value
+        select.gt.assert_called_with("id", 0)
+        select.gt.return_value.order.assert_called_with("id")
+        select.gt.return_value.order.return_value.limit.assert_called_with(100)
+
+    def test_iter_products_is_lazy(self, backfill_supabase):
+        """Only the first page should be fetched until the consumer drains it"""
+        execute = backfill_supabase.table.return_value.select.return_value.gt.return_value.order.return_value.limit.return_value.execute
+        execute.side_effect = [
+            MagicMock(data=[{"id": 1}, {"id": 2}]),
+            MagicMock(data=[{"id": 3}]),
+        ]
+
+        gen = iter_products_paginated(batch_size=2)
+        assert execute.call_count == 0
+
+        assert next(gen) == {"id": 1}
+        assert execute.call_count == 1
 
-    @patch('backfill_historical_prices.supabase')
-    def test_fetch_products_paginated_stops_at_last_page(self, mock_supabase):
+        assert [p["id"] for p in gen] == [2, 3]
+        assert execute.call_count == 2
+
+    def test_fetch_products_paginated_seeks_past_last_id(self, backfill_supabase):
+        """Each page should seek past the last id of the previous page"""
+        batch1 = [{"id": 3}, {"id": 7}]
+        batch2 = [{"id": 12}]
+
+        select = backfill_supabase.table.return_value.select.return_value
+        select.gt.return_value.order.return_value.limit.return_value.execute.side_effect = [
+            MagicMock(data=batch1), MagicMock(data=batch2),
+        ]
+
+        result = fetch_products_paginated(batch_size=2)
+
+        assert [p["id"] for p in result] == [3, 7, 12]
+        assert select.gt.call_args_list == [call("id", 0), call("id", 7)]
+
+    def test_fetch_products_paginated_stops_at_last_page(self, backfill_supabase):
         """Should stop pagination when receiving less than batch_size"""
         # First batch returns exactly batch_size items
         batch1 = [{"id": i} for i in range(5)]
@@ -193,9 +264,7 @@ class TestFetchProductsPaginated:
         batch2 = [{"id": i} for i in range(5, 8)]
 
         responses = [MagicMock(data=batch1), MagicMock(data=batch2)]
-        mock_supabase.table.return_value.select.return_value.range.return_value.execute.side_effect = responses
-
-        from backfill_historical_prices import fetch_products_paginated
+        backfill_supabase.table.return_value.select.return_value.gt.return_value.order.return_value.limit.return_value.execute.side_effect = responses
 
         result = fetch_products_paginated(batch_size=5)
 
@@ -205,12 +274,11 @@ class TestFetchProductsPaginated:
 class TestBatchInsertPriceHistory:
     """Tests for batch_insert_price_history function in backfill_historical_prices.py"""
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_price_history_success(self, mock_supabase):
+    def test_batch_insert_price_history_success(self, respx_mock):
         """Should batch insert entries successfully"""
-        mock_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
-
-        from backfill_historical_prices import batch_insert_price_history
+        route = respx_mock.post(f"{REST_URL}/product_price_history").mock(
+            return_value=httpx.Response(201)
+        )
 
         entries = [
             {"product_id": 1, "usd_price": 10.0, "recorded_at": "2024-12-01 12:00:00"},
@@ -221,13 +289,13 @@ class TestBatchInsertPriceHistory:
 
         assert inserted == 2
         assert failed == 0
+        request = route.calls.last.request
+        assert "return=minimal" in request.headers["prefer"]
+        assert json.loads(request.content) == entries
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_price_history_multiple_batches(self, mock_supabase):
+    def test_batch_insert_price_history_multiple_batches(self, backfill_supabase):
         """Should split into multiple batches"""
-        mock_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
-
-        from backfill_historical_prices import batch_insert_price_history
+        backfill_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
 
         entries = [{"product_id": i, "usd_price": i * 10.0} for i in range(15)]
 
@@ -236,31 +304,49 @@ class TestBatchInsertPriceHistory:
         assert inserted == 15
         assert failed == 0
         # Should have been called 3 times (5, 5, 5)
-        assert mock_supabase.table.return_value.insert.call_count == 3
+        assert backfill_supabase.table.return_value.insert.call_count == 3
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_price_history_empty_entries(self, mock_supabase):
-        """Should handle empty entries list"""
-        from backfill_historical_prices import batch_insert_price_history
+    def test_batch_insert_price_history_full_year_single_request(self, backfill_supabase):
+        """A full year of history should go out as one minimal-return insert"""
+        backfill_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
+
+        entries = [{"product_id": 1, "usd_price": 10.0} for _ in range(365)]
+
+        inserted, failed = batch_insert_price_history(entries)
+
+        assert inserted == 365
+        assert failed == 0
+        backfill_supabase.table.return_value.insert.assert_called_once_with(entries, returning="minimal")
+
+    def test_batch_insert_price_history_accepts_generator(self, backfill_supabase):
+        """Entries may be streamed from a generator instead of a list"""
+        backfill_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
 
+        entries = ({"product_id": i, "usd_price": 1.0} for i in range(12))
+
+        inserted, failed = batch_insert_price_history(entries, batch_size=5, max_workers=1)
+
+        assert (inserted, failed) == (12, 0)
+        sizes = [len(c.args[0]) for c in backfill_supabase.table.return_value.insert.call_args_list]
+        assert sizes == [5, 5, 2]
+
+    def test_batch_insert_price_history_empty_entries(self, backfill_supabase):
+        """Should handle empty entries list"""
         inserted, failed = batch_insert_price_history([], batch_size=10)
 
         assert inserted == 0
         assert failed == 0
-        mock_supabase.table.return_value.insert.assert_not_called()
+        backfill_supabase.table.return_value.insert.assert_not_called()
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_price_history_fallback_on_batch_failure(self, mock_supabase):
+    def test_batch_insert_price_history_fallback_on_batch_failure(self, respx_mock):
         """Should fall back to individual inserts when batch fails"""
         # First batch fails, individual inserts succeed
-        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
-            Exception("Batch failed"),  # First batch fails
-            MagicMock(),  # Individual insert 1
-            MagicMock(),  # Individual insert 2
-            MagicMock(),  # Individual insert 3
-        ]
-
-        from backfill_historical_prices import batch_insert_price_history
+        route = respx_mock.post(f"{REST_URL}/product_price_history").mock(side_effect=[
+            httpx.Response(409, json={"code": "23505", "message": "duplicate key value"}),
+            httpx.Response(201, json=[{}]),  # Individual insert 1
+            httpx.Response(201, json=[{}]),  # Individual insert 2
+            httpx.Response(201, json=[{}]),  # Individual insert 3
+        ])
 
         entries = [
             {"product_id": 1, "usd_price": 10.0},
@@ -272,18 +358,16 @@ class TestBatchInsertPriceHistory:
 
         assert inserted == 3
         assert failed == 0
+        assert route.call_count == 4
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_price_history_individual_failure(self, mock_supabase):
+    def test_batch_insert_price_history_individual_failure(self, backfill_supabase):
         """Should count individual failures after batch failure"""
-        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
+        backfill_supabase.table.return_value.insert.return_value.execute.side_effect = [
             Exception("Batch failed"),
             MagicMock(),  # First individual succeeds
             Exception("Individual failed"),  # Second individual fails
         ]
 
-        from backfill_historical_prices import batch_insert_price_history
-
         entries = [
             {"product_id": 1, "usd_price": 10.0},
             {"product_id": 2, "usd_price": 20.0},
@@ -298,92 +382,101 @@ class TestBatchInsertPriceHistory:
 class TestFetchProductsNeedingUpdate:
     """Tests for fetch_products_needing_update function in main.py"""
 
-    @patch('main.supabase')
-    def test_fetch_products_needing_update_single_batch(self, mock_supabase):
-        """Should fetch products needing updates in single batch"""
-        mock_response = MagicMock()
-        mock_response.data = [
-            {"id": 1, "url": "https://example.com/1", "usd_price": None},
-            {"id": 2, "url": "https://example.com/2", "last_updated": None},
-        ]
-        mock_supabase.table.return_value.select.return_value.or_.return_value.range.return_value.execute.return_value = mock_response
-
-        from main import fetch_products_needing_update
+    # The function only forwards its cutoffs; it never reads the clock, so a
+    # fixed value keeps the request payloads deterministic.
+    CUTOFF = datetime(2024, 12, 14, 10, 0, 0, tzinfo=timezone.utc)
 
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+    @patch('main._needs_update_rpc_missing', False)
+    def test_fetch_products_needing_update_single_batch(self, respx_mock):
+        """Should fetch products needing updates in single batch"""
+        route = respx_mock.post(f"{REST_URL}/rpc/products_needing_update").mock(
+            return_value=httpx.Response(200, json=[
+                {"id": 1, "url": "https://example.com/1", "usd_price": None},
+                {"id": 2, "url": "https://example.com/2", "last_updated": None},
+            ])
+        )
 
-        result = fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago)
+        result = fetch_products_needing_update(self.CUTOFF, self.CUTOFF)
 
         assert len(result) == 2
+        body = json.loads(route.calls.last.request.content)
+        assert body["after_id"] == 0
+        assert body["page_size"] == 500
 
-    @patch('main.supabase')
-    def test_fetch_products_needing_update_multiple_batches(self, mock_supabase):
+    def test_fetch_products_needing_update_multiple_batches(self, main_supabase):
         """Should paginate through multiple batches"""
         batch1 = [{"id": i} for i in range(1, 501)]  # 500 items
         batch2 = [{"id": i} for i in range(501, 601)]  # 100 items
 
         responses = [MagicMock(data=batch1), MagicMock(data=batch2)]
-        mock_supabase.table.return_value.select.return_value.or_.return_value.range.return_value.execute.side_effect = responses
-
-        from main import fetch_products_needing_update
-
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+        main_supabase.rpc.return_value.execute.side_effect = responses
 
-        result = fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size=500)
+        result = fetch_products_needing_update(self.CUTOFF, self.CUTOFF, batch_size=500)
 
         assert len(result) == 600
 
-    @patch('main.supabase')
-    def test_fetch_products_needing_update_empty_response(self, mock_supabase):
+    def test_fetch_products_needing_update_empty_response(self, main_supabase):
         """Should handle empty response"""
         mock_response = MagicMock()
         mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.or_.return_value.range.return_value.execute.return_value = mock_response
+        main_supabase.rpc.return_value.execute.return_value = mock_response
 
-        from main import fetch_products_needing_update
-
-        price_interval_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-
-        result = fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago)
+        result = fetch_products_needing_update(self.CUTOFF, self.CUTOFF)
 
         assert result == []
 
-    @patch('main.supabase')
-    def test_fetch_products_needing_update_or_filter_format(self, mock_supabase):
-        """Should construct correct OR filter"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_chain = mock_supabase.table.return_value.select.return_value.or_.return_value.range.return_value
-        mock_chain.execute.return_value = mock_response
+    def test_fetch_products_needing_update_rpc_params(self, main_supabase):
+        """Should pass both cutoffs and the seek cursor to the RPC"""
+        main_supabase.rpc.return_value.execute.return_value = MagicMock(data=[])
+
+        price_interval_ago = datetime(2024, 12, 15, 11, 0, 0, tzinfo=timezone.utc)
+        twenty_four_hours_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
 
-        from main import fetch_products_needing_update
+        fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago, batch_size=250)
+
+        main_supabase.rpc.assert_called_once_with("products_needing_update", {
+            "price_cutoff": "2024-12-15T11:00:00+00:00",
+            "image_cutoff": "2024-12-15T10:00:00+00:00",
+            "after_id": 0,
+            "page_size": 250,
+        })
+        main_supabase.table.assert_not_called()
+
+    @patch('main._needs_update_rpc_missing', False)
+    def test_fetch_products_needing_update_falls_back_to_or_filter(self, main_supabase):
+        """Should use the or= filter when the RPC has not been migrated yet"""
+        main_supabase.rpc.return_value.execute.side_effect = Exception(
+            "{'code': 'PGRST202', 'message': 'Could not find the function public.products_needing_update'}"
+        )
+        mock_chain = main_supabase.table.return_value.select.return_value.or_.return_value.gt.return_value.order.return_value.limit.return_value
+        mock_chain.execute.return_value = MagicMock(data=[{"id": 1}])
 
         price_interval_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
         twenty_four_hours_ago = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
 
-        fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago)
+        result = main.fetch_products_needing_update(price_interval_ago, twenty_four_hours_ago)
+
+        assert result == [{"id": 1}]
+        assert main._needs_update_rpc_missing is True
+        or_filter = main_supabase.table.return_value.select.return_value.or_.call_args[0][0]
+        assert or_filter == main.build_update_or_query(price_interval_ago, twenty_four_hours_ago)
 
-        # Check that or_ was called with correct filter
-        or_call = mock_supabase.table.return_value.select.return_value.or_
-        assert or_call.called
-        or_filter = or_call.call_args[0][0]
-        assert "last_updated.is.null" in or_filter
-        assert "usd_price.is.null" in or_filter
-        assert "image_url.is.null" in or_filter
+    @patch('main._needs_update_rpc_missing', False)
+    def test_fetch_products_needing_update_propagates_other_errors(self, main_supabase):
+        """Should not mask RPC failures other than a missing function"""
+        main_supabase.rpc.return_value.execute.side_effect = Exception("57014 statement timeout")
+
+        with pytest.raises(Exception, match="57014"):
+            fetch_products_needing_update(self.CUTOFF, self.CUTOFF)
+        main_supabase.table.assert_not_called()
 
 
 class TestFlushPriceHistoryBatch:
     """Tests for _flush_price_history_batch function in main.py"""
 
-    @patch('main.supabase')
-    def test_flush_price_history_batch_success(self, mock_supabase):
+    def test_flush_price_history_batch_success(self, main_supabase):
         """Should batch insert price history entries"""
-        mock_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
-
-        from main import _flush_price_history_batch
+        main_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
 
         batch = [
             {"product_id": 1, "usd_price": 10.0},
@@ -392,31 +485,50 @@ class TestFlushPriceHistoryBatch:
 
         success, failed = _flush_price_history_batch(batch)
 
-        mock_supabase.table.assert_called_with("product_price_history")
+        main_supabase.table.assert_called_with("product_price_history")
         assert success == 2
         assert failed == 0
 
-    @patch('main.supabase')
-    def test_flush_price_history_batch_empty(self, mock_supabase):
+    def test_flush_price_history_batch_empty(self, main_supabase):
         """Should handle empty batch"""
-        from main import _flush_price_history_batch
-
         success, failed = _flush_price_history_batch([])
 
         assert success == 0
         assert failed == 0
-        mock_supabase.table.return_value.insert.assert_not_called()
+        main_supabase.table.return_value.insert.assert_not_called()
 
-    @patch('main.supabase')
-    def test_flush_price_history_batch_fallback_on_failure(self, mock_supabase):
-        """Should fall back to individual inserts on batch failure"""
-        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
+    @patch('main._price_history_rpc_missing', False)
+    def test_flush_price_history_batch_skips_duplicates_on_failure(self, main_supabase):
+        """A rejected batch should be retried once via the ON CONFLICT DO NOTHING RPC"""
+        main_supabase.table.return_value.insert.return_value.execute.side_effect = [
+            Exception("23505 duplicate key value violates unique constraint"),
+        ]
+        main_supabase.rpc.return_value.execute.return_value = MagicMock(data=1)
+
+        batch = [
+            {"product_id": 1, "usd_price": 10.0},
+            {"product_id": 2, "usd_price": 20.0},
+        ]
+
+        success, failed = _flush_price_history_batch(batch)
+
+        # One batch insert + one RPC; no per-row retries
+        assert main_supabase.table.return_value.insert.call_count == 1
+        main_supabase.rpc.assert_called_once_with(
+            "insert_price_history_skip_duplicates", {"rows": batch}
+        )
+        assert success == 1
+        assert failed == 0
+
+    @patch('main._price_history_rpc_missing', False)
+    def test_flush_price_history_batch_fallback_on_failure(self, main_supabase):
+        """Should fall back to individual inserts when the RPC also fails"""
+        main_supabase.table.return_value.insert.return_value.execute.side_effect = [
             Exception("Batch failed"),  # Batch fails
             MagicMock(),  # Individual 1
             MagicMock(),  # Individual 2
         ]
-
-        from main import _flush_price_history_batch
+        main_supabase.rpc.return_value.execute.side_effect = Exception("23514 check constraint")
 
         batch = [
             {"product_id": 1, "usd_price": 10.0},
@@ -426,48 +538,118 @@ class TestFlushPriceHistoryBatch:
         success, failed = _flush_price_history_batch(batch)
 
         # Should have called insert 3 times (1 batch + 2 individual)
-        assert mock_supabase.table.return_value.insert.call_count == 3
+        assert main_supabase.table.return_value.insert.call_count == 3
         assert success == 2
         assert failed == 0
 
-    @patch('main.supabase')
-    def test_flush_price_history_batch_handles_individual_failure(self, mock_supabase):
+    @patch('main._price_history_rpc_missing', False)
+    def test_flush_price_history_batch_remembers_missing_rpc(self, main_supabase):
+        """A missing RPC should be tried once, then skipped on later flushes"""
+        main_supabase.table.return_value.insert.return_value.execute.side_effect = [
+            Exception("Batch failed"), MagicMock(),
+            Exception("Batch failed"), MagicMock(),
+        ]
+        main_supabase.rpc.return_value.execute.side_effect = Exception(
+            "{'code': 'PGRST202', 'message': 'Could not find the function'}"
+        )
+
+        batch = [{"product_id": 1, "usd_price": 10.0}]
+
+        assert main._flush_price_history_batch(batch) == (1, 0)
+        assert main._flush_price_history_batch(batch) == (1, 0)
+
+        assert main._price_history_rpc_missing is True
+        assert main_supabase.rpc.call_count == 1
+
+    @patch('main._price_history_rpc_missing', True)
+    def test_flush_price_history_batch_handles_individual_failure(self, main_supabase):
         """Should handle individual insert failures gracefully"""
-        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
+        main_supabase.table.return_value.insert.return_value.execute.side_effect = [
             Exception("Batch failed"),
             Exception("Individual 1 failed"),
             MagicMock(),  # Individual 2 succeeds
         ]
 
-        from main import _flush_price_history_batch
-
         batch = [
             {"product_id": 1, "usd_price": 10.0},
             {"product_id": 2, "usd_price": 20.0},
         ]
 
         # Should not raise exception
-        _flush_price_history_batch(batch)
+        assert _flush_price_history_batch(batch) == (1, 1)
+
+
+class TestFlushProductUpdates:
+    """Tests for _flush_product_updates function in main.py"""
+
+    UPDATES = [
+        {"product_id": 1, "usd_price": 10.0, "last_updated": "2024-12-15T10:00:00+00:00"},
+        {"product_id": 2, "last_image_update": "2024-12-15T10:00:00+00:00"},
+    ]
+
+    @patch('main._record_price_rpc_missing', False)
+    def test_flush_product_updates_calls_rpc(self, main_supabase):
+        """The whole batch should go out as one record_price_batch call"""
+        main_supabase.rpc.return_value.execute.return_value = MagicMock(data=2)
+
+        assert _flush_product_updates(self.UPDATES) == (2, 0)
+
+        main_supabase.rpc.assert_called_once_with("record_price_batch", {"rows": self.UPDATES})
+        main_supabase.table.assert_not_called()
+
+    @patch('main._record_price_rpc_missing', False)
+    @patch('main._price_history_rpc_missing', True)
+    def test_flush_product_updates_falls_back_when_rpc_missing(self, main_supabase):
+        """Without the RPC, each product is patched and priced rows go to history"""
+        main_supabase.rpc.return_value.execute.side_effect = Exception(
+            "{'code': 'PGRST202', 'message': 'Could not find the function'}"
+        )
+
+        assert _flush_product_updates(self.UPDATES) == (2, 0)
+
+        assert main._record_price_rpc_missing is True
+        table = main_supabase.table.return_value
+        table.insert.assert_called_once_with([{"product_id": 1, "usd_price": 10.0}])
+        assert table.update.call_args_list == [
+            call({"usd_price": 10.0, "last_updated": "2024-12-15T10:00:00+00:00"}),
+            call({"last_image_update": "2024-12-15T10:00:00+00:00"}),
+        ]
+        assert table.update.return_value.eq.call_args_list == [call("id", 1), call("id", 2)]
+
+    @patch('main._record_price_rpc_missing', False)
+    def test_flush_product_updates_counts_failed_patches(self, main_supabase):
+        """A failed RPC replays per product and reports individual failures"""
+        main_supabase.rpc.return_value.execute.side_effect = Exception("57014 statement timeout")
+        main_supabase.table.return_value.update.return_value.eq.return_value.execute.side_effect = \
+            side_effect_sequence(Exception("update failed"), "ok")
+
+        assert _flush_product_updates(self.UPDATES) == (1, 1)
+        # A transient failure should not disable the RPC for later batches
+        assert main._record_price_rpc_missing is False
+
+    def test_flush_product_updates_empty(self, main_supabase):
+        """Should not touch the database for an empty batch"""
+        assert _flush_product_updates([]) == (0, 0)
+        main_supabase.rpc.assert_not_called()
 
 
 class TestPaginationEdgeCases:
     """Edge case tests for pagination logic"""
 
-    def test_pagination_offset_calculation(self):
-        """Should calculate correct offset for pagination"""
-        batch_size = 500
-
-        # First page
-        offset = 0
-        assert (offset, offset + batch_size - 1) == (0, 499)
+    def test_pagination_seek_cursor(self, main_supabase):
+        """The seek cursor should follow the last id of each full page, gaps included"""
+        main_supabase.rpc.return_value.execute.side_effect = [
+            MagicMock(data=[{"id": 1}, {"id": 2}]),
+            MagicMock(data=[{"id": 40}, {"id": 41}]),
+            MagicMock(data=[{"id": 900}]),
+        ]
 
-        # Second page
-        offset = 500
-        assert (offset, offset + batch_size - 1) == (500, 999)
+        cutoff = datetime(2024, 12, 15, 10, 0, 0, tzinfo=timezone.utc)
+        result = fetch_products_needing_update(cutoff, cutoff, batch_size=2)
 
-        # Third page
-        offset = 1000
-        assert (offset, offset + batch_size - 1) == (1000, 1499)
+        assert len(result) == 5
+        after_ids = [c.args[1]["after_id"] for c in main_supabase.rpc.call_args_list]
+        assert after_ids == [0, 2, 41]
 
     def test_batch_size_boundary(self):
         """Should handle batch at exactly batch_size"""
@@ -475,9 +657,7 @@ class TestPaginationEdgeCases:
         entries = list(range(100))
 
         # One full batch
-        batches = []
-        for i in range(0, len(entries), batch_size):
-            batches.append(entries[i:i + batch_size])
+        batches = list(backfill_historical_prices._chunked(entries, batch_size))
 
         assert len(batches) == 1
         assert len(batches[0]) == 100
@@ -487,9 +667,7 @@ class TestPaginationEdgeCases:
         batch_size = 100
         entries = list(range(101))
 
-        batches = []
-        for i in range(0, len(entries), batch_size):
-            batches.append(entries[i:i + batch_size])
+        batches = list(backfill_historical_prices._chunked(entries, batch_size))
 
         assert len(batches) == 2
         assert len(batches[0]) == 100
@@ -499,11 +677,9 @@ class TestPaginationEdgeCases:
 class TestCleanupDirectoryEdgeCases:
     """Edge case tests for directory cleanup"""
 
-    def test_cleanup_directory_with_files(self):
+    def test_cleanup_directory_with_files(self, chrome_dir):
         """Should clean up directory containing files"""
-        from main import cleanup_driver
-
-        temp_dir = tempfile.mkdtemp(prefix="test_chrome_")
+        temp_dir = chrome_dir
 
         # Create some files in the temp directory
         test_file = os.path.join(temp_dir, "test_file.txt")
@@ -511,15 +687,13 @@ class TestCleanupDirectoryEdgeCases:
             f.write("test content")
 
         mock_driver = MagicMock()
-        cleanup_driver(mock_driver, temp_dir)
+        cleanup_driver(mock_driver, temp_dir).result()
 
         assert not os.path.exists(temp_dir)
 
-    def test_cleanup_directory_with_subdirectories(self):
+    def test_cleanup_directory_with_subdirectories(self, chrome_dir):
         """Should clean up directory containing subdirectories"""
-        from main import cleanup_driver
-
-        temp_dir = tempfile.mkdtemp(prefix="test_chrome_")
+        temp_dir = chrome_dir
 
         # Create subdirectory with files
         sub_dir = os.path.join(temp_dir, "subdir")
@@ -529,7 +703,7 @@ class TestCleanupDirectoryEdgeCases:
             f.write("nested content")
 
         mock_driver = MagicMock()
-        cleanup_driver(mock_driver, temp_dir)
+        cleanup_driver(mock_driver, temp_dir).result()
 
         assert not os.path.exists(temp_dir)
 
@@ -537,12 +711,9 @@ class TestCleanupDirectoryEdgeCases:
 class TestBatchInsertReturnValues:
     """Tests for batch insert return value accuracy"""
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_returns_correct_counts_all_success(self, mock_supabase):
+    def test_batch_insert_returns_correct_counts_all_success(self, backfill_supabase):
         """Should return correct counts when all succeed"""
-        mock_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
-
-        from backfill_historical_prices import batch_insert_price_history
+        backfill_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock()
 
         entries = [{"product_id": i} for i in range(25)]
         inserted, failed = batch_insert_price_history(entries, batch_size=10)
@@ -551,33 +722,78 @@ class TestBatchInsertReturnValues:
         assert inserted == 25
         assert failed == 0
 
-    @patch('backfill_historical_prices.supabase')
-    def test_batch_insert_returns_correct_counts_partial_failure(self, mock_supabase):
+    def test_batch_insert_returns_correct_counts_partial_failure(self, backfill_supabase):
         """Should return correct counts on partial failure"""
         # Batch 1 fails, falls back to individual (10 entries, all succeed)
         # Batch 2 succeeds (10 entries)
         # Batch 3 fails, falls back to individual (5 entries, 2 fail)
-        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
+        backfill_supabase.table.return_value.insert.return_value.execute.side_effect = side_effect_sequence(
             Exception("Batch 1 failed"),
-            *[MagicMock() for _ in range(10)],  # 10 individual successes
-            MagicMock(),  # Batch 2 succeeds
+            *["ok"] * 10,  # 10 individual successes
+            "ok",  # Batch 2 succeeds
             Exception("Batch 3 failed"),
-            MagicMock(),  # Individual 1 succeeds
+            "ok",  # Individual 1 succeeds
             Exception("Individual 2 fails"),
-            MagicMock(),  # Individual 3 succeeds
+            "ok",  # Individual 3 succeeds
             Exception("Individual 4 fails"),
-            MagicMock(),  # Individual 5 succeeds
-        ]
-
-        from backfill_historical_prices import batch_insert_price_history
+            "ok",  # Individual 5 succeeds
+        )
 
         entries = [{"product_id": i} for i in range(25)]
-        inserted, failed = batch_insert_price_history(entries, batch_size=10)
+        # One worker keeps batches sequential so the side_effect order holds
+        inserted, failed = batch_insert_price_history(entries, batch_size=10, max_workers=1)
 
         # 10 (from batch 1 fallback) + 10 (batch 2) + 3 (from batch 3 fallback)
         assert inserted == 23
         assert failed == 2
 
+    def test_batch_insert_concurrent_counts_with_failed_batch(self, backfill_supabase):
+        """Concurrent batches should still aggregate counts from each fallback"""
+        def insert(payload, **kwargs):
+            builder = MagicMock()
+            # Reject the middle batch as a whole, and product 12 on its own
+            rejected = (isinstance(payload, list) and payload[0]["product_id"] == 10) or \
+                (isinstance(payload, dict) and payload["product_id"] == 12)
+            if rejected:
+                builder.execute.side_effect = Exception("rejected")
+            return builder
+
+        backfill_supabase.table.return_value.insert.side_effect = insert
+
+        entries = [{"product_id": i} for i in range(25)]
+        inserted, failed = batch_insert_price_history(entries, batch_size=10, max_workers=3)
+
+        assert inserted == 24
+        assert failed == 1
+
+    def test_batch_insert_concurrent_bounds_entries_pulled(self, backfill_supabase):
+        """Only max_workers batches should be drawn from a generator while they are in flight"""
+        release = threading.Event()
+        pulled = 0
+
+        def stream():
+            nonlocal pulled
+            for i in range(5000):
+                pulled += 1
+                yield {"product_id": i}
+
+        def insert(payload, **kwargs):
+            builder = MagicMock()
+            builder.execute.side_effect = lambda: release.wait(1)
+            return builder
+
+        backfill_supabase.table.return_value.insert.side_effect = insert
+
+        with ThreadPoolExecutor(max_workers=1) as runner:
+            future = runner.submit(batch_insert_price_history, stream(), batch_size=10, max_workers=2)
+            time.sleep(0.2)
+            pulled_while_blocked = pulled
+            release.set()
+            assert future.result(timeout=5) == (5000, 0)
+
+        # Two batches in flight, plus the one waiting to be submitted
+        assert pulled_while_blocked <= 30
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
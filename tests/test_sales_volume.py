@@ -10,16 +10,10 @@ These tests cover:
 
 Run with: python -m pytest tests/test_sales_volume.py -v
 """
-import sys
 from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 import pytest
 
-# Mock external dependencies before importing main
-sys.modules['secretsFile'] = MagicMock()
-sys.modules['secretsFile'].SUPABASE_URL = 'https://test.supabase.co'
-sys.modules['secretsFile'].SUPABASE_KEY = 'test-key'
-
 
 def _make_response(status_code=200, json_data=None, json_raises=False):
     """Build a fake requests response."""
@@ -144,6 +138,21 @@ class TestParseDailySalesBuckets:
         assert rows[0]["transaction_count"] is None
         assert rows[0]["market_price"] is None
 
+    def test_currency_symbol_in_count_becomes_none(self):
+        """Counts only drop thousands separators; a '$' marks a misread field"""
+        from main import parse_daily_sales_buckets
+
+        buckets = [{
+            "bucketStartDate": "2026-07-01",
+            "quantitySold": "$12",
+            "transactionCount": "1,200",
+        }]
+
+        rows = parse_daily_sales_buckets(buckets, product_id=1)
+
+        assert rows[0]["quantity_sold"] is None
+        assert rows[0]["transaction_count"] == 1200
+
     def test_todays_partial_bucket_included(self):
         """Today's (partial) bucket should be included"""
         from main import parse_daily_sales_buckets
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Unit tests for update_shopify_skus.py
+
+These tests cover:
+- extract_set_name(title, tags), including the product-type priority
+- detect_product_type(combined), including the Pokemon Center ETB rule
+- find_best_matches(shopify_products, sku_mapping): scoring, MATCH_THRESHOLD,
+  products with no detectable set, and the exact fast path vs cdist
+- process_shopify_export / save_updated_csv: SKU propagation by handle, and
+  writing over the export itself
+
+Run with: python -m pytest tests/test_update_shopify_skus.py -v
+"""
+import csv
+
+import pytest
+
+import update_shopify_skus
+from update_shopify_skus import (
+    detect_product_type,
+    extract_set_name,
+    find_best_match,
+    find_best_matches,
+    load_sku_mapping,
+    process_shopify_export,
+    save_updated_csv,
+)
+
+MAPPING_ROWS = [
+    ["Product ID", "SKU", "Generation", "Set Code", "Set Name", "Product Type",
+     "Variant", "Shopify Handle (suggested)"],
+    ["1", "SV-DRI-BB", "SV", "DRI", "Destined Rivals", "Booster Box", "",
+     "destined-rivals-booster-box"],
+    ["2", "SV-DRI-ETB", "SV", "DRI", "Destined Rivals", "Elite Trainer Box", "",
+     "destined-rivals-elite-trainer-box"],
+    ["3", "SV-DRI-PCETB", "SV", "DRI", "Destined Rivals",
+     "Pokemon Center Exclusive Elite Trainer Box", "Pokemon Center",
+     "destined-rivals-pokemon-center-elite-trainer-box"],
+    ["4", "SV-BLK-BB", "SV", "BLK", "Black Bolt", "Booster Box", "",
+     "black-bolt-booster-box"],
+    ["5", "SV-BLK-BB-JP", "SV", "BLK", "Black Bolt", "Booster Box", "Japanese",
+     "japanese-black-bolt-booster-box"],
+]
+
+EXPORT_HEADER = ["Handle", "Title", "Tags", "Variant SKU", "Image Src"]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def _product(title, handle="", tags=""):
+    return {"title": title, "handle": handle, "tags": tags, "current_sku": ""}
+
+
+@pytest.fixture
+def sku_mapping(tmp_path):
+    """The fixture mapping, loaded through load_sku_mapping."""
+    return load_sku_mapping(_write_csv(tmp_path / "sku_mapping.csv", MAPPING_ROWS))
+
+
+class TestExtractSetName:
+    """Tests for extract_set_name function"""
+
+    def test_text_before_product_type(self):
+        """Should return the text before the product type"""
+        assert extract_set_name("Scarlet & Violet - Destined Rivals Elite Trainer Box", "") \
+            == "Scarlet & Violet - Destined Rivals"
+
+    def test_higher_priority_type_wins(self):
+        """Booster Box outranks Tin, whose keyword also occurs inside "Destined" """
+        assert extract_set_name("Destined Rivals Booster Box", "") == "Destined Rivals"
+
+    def test_language_prefix_stripped(self):
+        """Should drop a leading language prefix"""
+        assert extract_set_name("Japanese - Black Bolt Booster Box", "") == "Black Bolt"
+
+    def test_falls_back_to_first_set_like_tag(self):
+        """Should skip generic tags when no product type is in the title"""
+        assert extract_set_name("Mystery Bundle", "Pokemon, Sealed Product, Surging Sparks") \
+            == "Surging Sparks"
+
+    def test_none_without_type_or_tags(self):
+        """Should return None when nothing names a set"""
+        assert extract_set_name("Mystery Bundle", "Pokemon, ETB") is None
+
+
+class TestDetectProductType:
+    """Tests for detect_product_type function"""
+
+    @pytest.mark.parametrize("combined, expected", [
+        ("destined rivals elite trainer box", "Elite Trainer Box"),
+        ("destined rivals pokemon center elite trainer box",
+         "Pokemon Center Exclusive Elite Trainer Box"),
+        ("pokémon center etb", "Pokemon Center Exclusive Elite Trainer Box"),
+        # The Pokemon Center rule only applies to ETBs
+        ("pokemon center booster box", "Booster Box"),
+        ("destined rivals booster bundle", "Booster Bundle"),
+        ("mystery item", None),
+    ])
+    def test_detects_type(self, combined, expected):
+        assert detect_product_type(combined) == expected
+
+
+class TestFindBestMatches:
+    """Tests for find_best_matches function"""
+
+    def test_exact_set_and_type(self, sku_mapping):
+        """Exact set and type take the fast path: 80 + no-variant 10 + handle 5"""
+        match = find_best_match(
+            _product("Destined Rivals Booster Box", "destined-rivals-booster-box"), sku_mapping)
+        assert match["sku"] == "SV-DRI-BB"
+        assert match["match_score"] == 95
+
+    def test_fast_path_agrees_with_cdist(self, sku_mapping):
+        """With the exact index emptied, the cdist path picks the same SKU and score"""
+        products = [
+            _product("Destined Rivals Booster Box", "destined-rivals-booster-box"),
+            _product("Destined Rivals Pokemon Center Elite Trainer Box", "dri-pc-etb"),
+            _product("Japanese - Black Bolt Booster Box", "black-bolt-jp"),
+        ]
+        fast = find_best_matches(products, sku_mapping)
+        sku_mapping.by_set_and_type.clear()
+        fuzzy = find_best_matches(products, sku_mapping)
+
+        assert [m["sku"] for m in fast] == ["SV-DRI-BB", "SV-DRI-PCETB", "SV-BLK-BB-JP"]
+        assert [m["sku"] for m in fuzzy] == [m["sku"] for m in fast]
+        assert [m["match_score"] for m in fuzzy] \
+            == pytest.approx([m["match_score"] for m in fast])
+
+    def test_inexact_set_name_still_matches(self, sku_mapping):
+        """A set name with an era prefix still matches its set"""
+        match = find_best_match(
+            _product("Scarlet & Violet - Black Bolt Booster Box", "sv-black-bolt"), sku_mapping)
+        assert match["sku"] == "SV-BLK-BB"
+        assert match["detected_set"] == "Scarlet & Violet - Black Bolt"
+
+    def test_detected_variant_picks_variant_sku(self, sku_mapping):
+        """A Japanese product should take the Japanese SKU of its set"""
+        match = find_best_match(_product("Japanese - Black Bolt Booster Box"), sku_mapping)
+        assert match["sku"] == "SV-BLK-BB-JP"
+
+    def test_below_threshold_unmatched(self, sku_mapping, monkeypatch):
+        """Should reject a best match scoring under MATCH_THRESHOLD"""
+        product = _product("Destined Rivals Booster Box", "destined-rivals-booster-box")
+        monkeypatch.setattr(update_shopify_skus, "MATCH_THRESHOLD", 95)
+        assert find_best_match(product, sku_mapping)["match_score"] == 95
+
+        monkeypatch.setattr(update_shopify_skus, "MATCH_THRESHOLD", 96)
+        assert find_best_match(product, sku_mapping) is None
+
+    def test_no_detected_set_unmatched(self, sku_mapping):
+        """Should not score a product with no set, even on an exact type and handle"""
+        # "Booster Box" is a generic tag: it gives the type but never the set
+        product = _product("Mystery Item", "destined-rivals-booster-box", "Booster Box")
+        assert find_best_match(product, sku_mapping) is None
+
+    def test_one_result_per_product(self, sku_mapping):
+        """Should return one entry per product, in order"""
+        products = [_product("Mystery Item"), _product("Black Bolt Booster Box")]
+        matches = find_best_matches(products, sku_mapping)
+        assert matches[0] is None
+        assert matches[1]["sku"] == "SV-BLK-BB"
+
+
+class TestProcessShopifyExport:
+    """Tests for process_shopify_export and save_updated_csv"""
+
+    @pytest.fixture
+    def paths(self, tmp_path):
+        export = _write_csv(tmp_path / "products_export.csv", [
+            EXPORT_HEADER,
+            ["destined-rivals-bb", "Destined Rivals Booster Box", "Pokemon", "OLD-1", "a.jpg"],
+            ["destined-rivals-bb", "", "", "", "b.jpg"],        # image row
+            ["destined-rivals-bb", "", "", "OLD-1-V2", ""],     # variant row
+            ["mystery", "Mystery Item", "Pokemon", "OLD-2", "c.jpg"],
+            ["mystery", "", "", "OLD-2-V2", ""],
+        ])
+        mapping = _write_csv(tmp_path / "sku_mapping.csv", MAPPING_ROWS)
+        return export, mapping
+
+    def test_sku_propagates_by_handle(self, paths, tmp_path):
+        """Variant rows of a matched product take its SKU; image rows stay blank"""
+        export, mapping = paths
+        matched, unmatched, rows = process_shopify_export(export, mapping)
+
+        assert [m["match"]["sku"] for m in matched] == ["SV-DRI-BB"]
+        assert [u["handle"] for u in unmatched] == ["mystery"]
+
+        output = str(tmp_path / "products_import.csv")
+        save_updated_csv(rows, output)
+        with open(output, newline="", encoding="utf-8") as f:
+            skus = [row[3] for row in csv.reader(f)]
+        assert skus == ["Variant SKU", "SV-DRI-BB", "", "SV-DRI-BB", "OLD-2", "OLD-2-V2"]
+
+    def test_save_over_export(self, paths):
+        """Should allow the output to overwrite the export it streams from"""
+        export, mapping = paths
+        _, _, rows = process_shopify_export(export, mapping)
+        save_updated_csv(rows, export)
+
+        with open(export, newline="", encoding="utf-8") as f:
+            written = list(csv.reader(f))
+        assert len(written) == 6
+        assert written[1][3] == "SV-DRI-BB"
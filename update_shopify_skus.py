@@ -13,9 +13,17 @@ Usage:
 
 import argparse
 import csv
+import functools
 import re
 import logging
-from difflib import SequenceMatcher
+import os
+import sys
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+import numpy as np
+from rapidfuzz import fuzz, process
 
 # === Logging Setup ===
 logging.basicConfig(
@@ -40,10 +48,67 @@ PRODUCT_TYPE_PATTERNS = [
     ("Blister", ["blister"]),
 ]
 
+# PRODUCT_TYPE_PATTERNS flattened to (keyword, product_type, is_etb) in
+# priority order, so detection is one pass of substring checks. For titles
+# this short, str `in` beats a single-pass regex alternation.
+_PRODUCT_TYPE_KEYWORDS = tuple(
+    (keyword, product_type, 'elite trainer box' in product_type.lower())
+    for product_type, keywords in PRODUCT_TYPE_PATTERNS
+    for keyword in keywords
+)
+
+# sku_mapping.csv (from generate_skus.py): SkuMapping attribute ->
+# (column, optional, repeats). Values in "repeats" columns recur across many
+# entries and are interned, so each distinct value is one shared string.
+SKU_MAPPING_COLUMNS = {
+    'product_ids': ('Product ID', False, False),
+    'skus': ('SKU', False, False),
+    'generations': ('Generation', False, True),
+    'set_codes': ('Set Code', False, True),
+    'set_names': ('Set Name', False, True),
+    'product_types': ('Product Type', False, True),
+    'variants': ('Variant', True, True),
+    'shopify_handles': ('Shopify Handle (suggested)', True, False),
+}
+
+# Minimum weighted score (0-100) for a SKU to be accepted as a match.
+MATCH_THRESHOLD = 40
+
+# Shopify products scored per block in find_best_matches. Bounds the score
+# matrix to this many rows x len(sku_mapping) (about 8 MB at 1000 SKUs).
+MATCH_BLOCK_ROWS = 2048
+
+# Output file buffer. Exports run to tens of MB of HTML descriptions; an 8 KB
+# default buffer means thousands of write syscalls.
+CSV_WRITE_BUFFER = 1024 * 1024
+
+_NORMALIZE_RE = re.compile(r'[^a-z0-9\s]')
+_LANGUAGE_PREFIX_RE = re.compile(r'^(Japanese|Korean|Chinese)\s*[-–—]\s*', re.IGNORECASE)
+
+# Generic Shopify tags that never name a set (compared lowercased).
+_SKIP_TAGS = frozenset({
+    'sealed product', 'pokémon', 'pokemon', 'booster box', 'etb',
+    'booster pack', 'booster bundle', 'pokémon japan', 'pokemon japan',
+})
+
+# "<set name> - <product type>", one alternative (and one group) per product
+# type in PRODUCT_TYPE_PATTERNS priority order. Anchored matching tries every
+# alternative at the start of the title before giving up, so the
+# highest-priority product type found anywhere wins, and a title with none
+# fails after one pass instead of being rescanned from every offset.
+_SET_NAME_RE = re.compile(
+    '|'.join(
+        rf'(.+?)\s*[-–—]?\s*{re.escape(product_type)}'
+        for product_type, _ in PRODUCT_TYPE_PATTERNS
+    ),
+    re.IGNORECASE,
+)
+
 
+@functools.lru_cache(maxsize=8192)
 def normalize_text(text: str) -> str:
-    """Normalize text for matching."""
-    return re.sub(r'[^a-z0-9\s]', '', text.lower()).strip()
+    """Normalize text for matching. Cached: set names and types repeat heavily."""
+    return _NORMALIZE_RE.sub('', text.lower()).strip()
 
 
 def extract_set_name(title: str, tags: str) -> str | None:
@@ -52,49 +117,37 @@ def extract_set_name(title: str, tags: str) -> str | None:
     # or "Japanese - Scarlet & Violet – Black Bolt Booster Box"
 
     # Remove common prefixes
-    title_clean = re.sub(r'^(Japanese|Korean|Chinese)\s*[-–—]\s*', '', title, flags=re.IGNORECASE)
+    title_clean = _LANGUAGE_PREFIX_RE.sub('', title)
 
     # Try to extract set name (usually before product type)
-    for product_type, _ in PRODUCT_TYPE_PATTERNS:
-        pattern = rf'(.+?)\s*[-–—]?\s*{re.escape(product_type)}'
-        match = re.search(pattern, title_clean, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
+    match = _SET_NAME_RE.match(title_clean)
+    if match:
+        return match.group(match.lastindex).strip()
 
-    # Try from tags
+    # Try from tags: the first set-like (not generic) one
     if tags:
-        tag_list = [t.strip() for t in tags.split(',')]
-        # Look for set-like tags (not generic ones)
-        skip_tags = {'sealed product', 'pokémon', 'pokemon', 'booster box', 'etb',
-                     'booster pack', 'booster bundle', 'pokémon japan', 'pokemon japan'}
-        for tag in tag_list:
-            if tag.lower() not in skip_tags and len(tag) > 3:
+        for tag in tags.split(','):
+            tag = tag.strip()
+            if len(tag) > 3 and tag.lower() not in _SKIP_TAGS:
                 return tag
 
     return None
 
 
-def detect_product_type(title: str, tags: str) -> str | None:
-    """Detect product type from title or tags."""
-    combined = f"{title} {tags}".lower()
-
-    # Check for Pokemon Center first (variant)
-    is_pokemon_center = 'pokemon center' in combined or 'pokémon center' in combined
-
-    for product_type, keywords in PRODUCT_TYPE_PATTERNS:
-        for keyword in keywords:
-            if keyword in combined:
-                if is_pokemon_center and 'elite trainer box' in product_type.lower():
-                    return "Pokemon Center Exclusive Elite Trainer Box"
-                return product_type
+def detect_product_type(combined: str) -> str | None:
+    """Detect product type from the lowercased "title tags" string."""
+    for keyword, product_type, is_etb in _PRODUCT_TYPE_KEYWORDS:
+        if keyword in combined:
+            # Pokemon Center ETBs are their own product type
+            if is_etb and ('pokemon center' in combined or 'pokémon center' in combined):
+                return "Pokemon Center Exclusive Elite Trainer Box"
+            return product_type
 
     return None
 
 
-def detect_variant(title: str, tags: str) -> str | None:
-    """Detect variant from title or tags."""
-    combined = f"{title} {tags}".lower()
-
+def detect_variant(combined: str) -> str | None:
+    """Detect variant from the lowercased "title tags" string."""
     if 'japanese' in combined or 'japan' in combined:
         return "Japanese"
     if 'pokemon center' in combined or 'pokémon center' in combined:
@@ -105,151 +158,304 @@ def detect_variant(title: str, tags: str) -> str | None:
     return None
 
 
-def similarity_score(s1: str, s2: str) -> float:
-    """Calculate similarity between two strings."""
-    return SequenceMatcher(None, normalize_text(s1), normalize_text(s2)).ratio()
+def _unique_index(values: list[str]) -> tuple[list[str], np.ndarray]:
+    """Return the distinct values (first-seen order) and each value's position among them."""
+    positions = {}
+    inverse = np.fromiter(
+        (positions.setdefault(v, len(positions)) for v in values), dtype=np.intp, count=len(values)
+    )
+    return list(positions), inverse
+
+
+def _weighted_similarity(queries: list[str | None], choices: list[str | None],
+                         weight: int, scorer=fuzz.ratio) -> np.ndarray:
+    """Similarity of every query to every choice, in hundredths of a point (0-100*weight).
+
+    Strings must already be normalized; None marks a missing value, which
+    contributes nothing to the score. Each distinct pair is scored once in
+    one C-level cdist call and the result expanded to len(queries) x
+    len(choices): set names and product types repeat heavily on both sides.
+    Scores are whole-number similarities times weight, so they fit uint16.
+    """
+    unique_queries, query_idx = _unique_index(queries)
+    unique_choices, choice_idx = _unique_index(choices)
+    # workers=-1 spreads rows across all cores on rapidfuzz's native threads.
+    sims = process.cdist([q or '' for q in unique_queries], [c or '' for c in unique_choices],
+                         scorer=scorer, dtype=np.uint16, workers=-1)
+    sims *= weight
+    sims[[q is None for q in unique_queries]] = 0
+    sims[:, [c is None for c in unique_choices]] = 0
+    return sims[np.ix_(query_idx, choice_idx)]
+
+
+def _iter_csv(filepath: str) -> Iterator[list[str]]:
+    """Yield CSV rows one at a time; the file closes when the rows run out."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        yield from csv.reader(f)
+
+
+def _normalized_column(values: list[str]) -> list[str | None]:
+    """Normalize each value once; None marks a missing one."""
+    return [normalize_text(v) if v else None for v in values]
+
+
+@dataclass
+class SkuMapping:
+    """The SKU mapping stored column-wise: one list per field, indexed by entry.
+
+    The matched fields also keep a normalized copy, ready to hand to cdist.
+    """
+    product_ids: list[str]
+    skus: list[str]
+    generations: list[str]
+    set_codes: list[str]
+    set_names: list[str]
+    product_types: list[str]
+    variants: list[str]
+    shopify_handles: list[str]
+    norm_set_names: list[str | None] = field(init=False)
+    norm_product_types: list[str | None] = field(init=False)
+    norm_variants: list[str | None] = field(init=False)
+    norm_shopify_handles: list[str | None] = field(init=False)
+    # (normalized set name, normalized product type) -> entry indices
+    by_set_and_type: dict[tuple, list[int]] = field(init=False)
+
+    def __post_init__(self):
+        self.norm_set_names = _normalized_column(self.set_names)
+        self.norm_product_types = _normalized_column(self.product_types)
+        self.norm_variants = _normalized_column(self.variants)
+        self.norm_shopify_handles = _normalized_column(self.shopify_handles)
+        self.by_set_and_type = defaultdict(list)
+        for i, key in enumerate(zip(self.norm_set_names, self.norm_product_types)):
+            self.by_set_and_type[key].append(i)
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def entry(self, i: int) -> dict:
+        """Entry i as a dict, for reporting."""
+        return {
+            'product_id': self.product_ids[i],
+            'sku': self.skus[i],
+            'generation': self.generations[i],
+            'set_code': self.set_codes[i],
+            'set_name': self.set_names[i],
+            'product_type': self.product_types[i],
+            'variant': self.variants[i],
+            'shopify_handle': self.shopify_handles[i],
+        }
+
+
+def load_sku_mapping(filepath: str) -> SkuMapping:
+    """Load SKU mapping from CSV.
+
+    Columns are resolved to indices once from the header, and each row's
+    cells are appended straight onto the column lists.
+    """
+    rows = _iter_csv(filepath)
+    header = next(rows)
+    columns = [
+        (header.index(column) if column in header or not optional else None,
+         sys.intern if repeats else str, [])
+        for column, optional, repeats in SKU_MAPPING_COLUMNS.values()
+    ]
 
+    for row in rows:
+        for idx, convert, values in columns:
+            values.append(convert(row[idx]) if idx is not None and idx < len(row) else '')
+    return SkuMapping(*(values for _, _, values in columns))
 
-def load_sku_mapping(filepath: str) -> list[dict]:
-    """Load SKU mapping from CSV."""
-    mapping = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            mapping.append({
-                'product_id': row['Product ID'],
-                'sku': row['SKU'],
-                'generation': row['Generation'],
-                'set_code': row['Set Code'],
-                'set_name': row['Set Name'],
-                'product_type': row['Product Type'],
-                'variant': row.get('Variant', ''),
-                'shopify_handle': row.get('Shopify Handle (suggested)', ''),
-            })
-    return mapping
 
+def load_shopify_export(filepath: str) -> tuple[list[str], Iterator[list[str]]]:
+    """Load Shopify export CSV.
 
-def load_shopify_export(filepath: str) -> tuple[list[str], list[list[str]]]:
-    """Load Shopify export CSV."""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        header = next(reader)
-        rows = list(reader)
+    Returns the header and a lazy iterator over the remaining rows, so an
+    export is streamed rather than held in memory.
+    """
+    rows = _iter_csv(filepath)
+    header = next(rows)
     return header, rows
 
 
-def find_best_match(shopify_product: dict, sku_mapping: list[dict]) -> dict | None:
-    """Find the best matching SKU for a Shopify product."""
-    title = shopify_product['title']
-    tags = shopify_product['tags']
-    handle = shopify_product['handle']
-
-    # Extract info from Shopify product
-    detected_set = extract_set_name(title, tags)
-    detected_type = detect_product_type(title, tags)
-    detected_variant = detect_variant(title, tags)
-
-    best_match = None
-    best_score = 0
-
-    for sku_entry in sku_mapping:
-        score = 0
-
-        # Match by set name
-        if detected_set and sku_entry['set_name']:
-            set_sim = similarity_score(detected_set, sku_entry['set_name'])
-            score += set_sim * 50  # Weight: 50%
-
-        # Match by product type
-        if detected_type and sku_entry['product_type']:
-            type_sim = similarity_score(detected_type, sku_entry['product_type'])
-            score += type_sim * 30  # Weight: 30%
-
-        # Match by variant
-        if detected_variant and sku_entry['variant']:
-            if normalize_text(detected_variant) in normalize_text(sku_entry['variant']):
-                score += 15  # Weight: 15%
-        elif not detected_variant and not sku_entry['variant']:
-            score += 10  # Bonus for both having no variant
-
-        # Match by handle similarity
-        if handle and sku_entry['shopify_handle']:
-            handle_sim = similarity_score(handle, sku_entry['shopify_handle'])
-            score += handle_sim * 5  # Weight: 5%
-
-        if score > best_score:
-            best_score = score
-            best_match = {
-                **sku_entry,
-                'match_score': score,
+def _variant_bonus(detected_variant: str | None, sku_variant: str | None) -> int:
+    """Variant term, in points, for one pair of normalized variants (None = no variant)."""
+    if detected_variant is None:
+        return 10 if sku_variant is None else 0
+    return 15 if sku_variant is not None and detected_variant in sku_variant else 0
+
+
+def _detect(title: str, tags: str) -> tuple[str | None, str | None, str | None]:
+    """Detected (set name, product type, variant) for one Shopify product."""
+    # Lowercased once here and shared by both keyword detectors.
+    combined = f"{title} {tags}".lower()
+    return extract_set_name(title, tags), detect_product_type(combined), detect_variant(combined)
+
+
+def find_best_matches(shopify_products: list[dict], sku_mapping: SkuMapping) -> list[dict | None]:
+    """Find the best matching SKU for each Shopify product.
+
+    Scores all products against all SKU entries at once. Weights: set name
+    50%, product type 30%, variant 15% (10 when neither side has one),
+    handle 5%. Returns one match dict, or None below MATCH_THRESHOLD, per
+    product. Products with no detectable set name are not scored.
+    """
+    matches = [None] * len(shopify_products)
+    if not shopify_products or not sku_mapping:
+        return matches
+
+    detected = [_detect(p['title'], p['tags']) for p in shopify_products]
+    # Without a set name, type, variant and handle can reach at most 50, and
+    # those matches are almost always the right product from the wrong set.
+    # Leave such products unmatched for review instead of scoring them.
+    scored = [i for i, d in enumerate(detected) if d[0]]
+    if not scored:
+        return matches
+
+    detected_sets = _normalized_column([d[0] for d in detected])
+    detected_types = _normalized_column([d[1] for d in detected])
+    handles = _normalized_column([p['handle'] for p in shopify_products])
+
+    # Scores below are integers in hundredths of a point, so the whole
+    # weighted sum (at most 10000) fits uint16 lanes.
+    def record(i, idx, score):
+        if score >= MATCH_THRESHOLD * 100:
+            detected_set, detected_type, detected_variant = detected[i]
+            matches[i] = {
+                **sku_mapping.entry(idx),
+                'match_score': score / 100,
                 'detected_set': detected_set,
                 'detected_type': detected_type,
                 'detected_variant': detected_variant,
             }
 
-    # Only return if score is above threshold
-    if best_score >= 40:
-        return best_match
-    return None
+    # Fast path: a product whose set name and type exactly name SKU entries
+    # takes the best of those on variant and handle alone, skipping cdist.
+    fuzzy = []
+    for i in scored:
+        candidates = detected_types[i] and sku_mapping.by_set_and_type.get(
+            (detected_sets[i], detected_types[i]))
+        if not candidates:
+            fuzzy.append(i)
+            continue
+        needle = normalize_text(detected[i][2]) if detected[i][2] else None
+        handle = handles[i]
+        # Handle similarity rounded half up, as cdist does for integer output.
+        candidate_scores = [
+            8000 + 100 * _variant_bonus(needle, sku_mapping.norm_variants[j])
+            + (5 * int(fuzz.ratio(handle, sku_mapping.norm_shopify_handles[j]) + 0.5)
+               if handle and sku_mapping.norm_shopify_handles[j] is not None else 0)
+            for j in candidates
+        ]
+        best = max(range(len(candidates)), key=candidate_scores.__getitem__)
+        record(i, candidates[best], candidate_scores[best])
+    if not fuzzy:
+        return matches
+
+    detected_sets = [detected_sets[i] for i in fuzzy]
+    detected_types = [detected_types[i] for i in fuzzy]
+    handles = [handles[i] for i in fuzzy]
+    # Variant bonus: only a handful of distinct detected variants, so build
+    # one bonus row per variant and broadcast it.
+    variant_keys, variant_idx = _unique_index([detected[i][2] for i in fuzzy])
+    bonus_rows = np.empty((len(variant_keys), len(sku_mapping)), dtype=np.uint16)
+    for row, variant in enumerate(variant_keys):
+        needle = normalize_text(variant) if variant else None
+        bonus_rows[row] = [100 * _variant_bonus(needle, v) for v in sku_mapping.norm_variants]
+
+    # Score in fixed-size blocks of products so the score matrix stays
+    # MATCH_BLOCK_ROWS x len(sku_mapping) however large the export is.
+    best_idx = np.empty(len(fuzzy), dtype=np.intp)
+    best_scores = np.empty(len(fuzzy), dtype=np.uint16)
+    for start in range(0, len(fuzzy), MATCH_BLOCK_ROWS):
+        block = slice(start, start + MATCH_BLOCK_ROWS)
+        # Set names and types are compared as word sets, so "Scarlet & Violet -
+        # Destined Rivals" still scores well against "Destined Rivals". Handles
+        # normalize to a single token, where plain ratio is equivalent and cheaper.
+        scores = _weighted_similarity(detected_sets[block], sku_mapping.norm_set_names,
+                                      50, fuzz.token_set_ratio)
+        scores += _weighted_similarity(detected_types[block], sku_mapping.norm_product_types,
+                                       30, fuzz.token_set_ratio)
+        scores += _weighted_similarity(handles[block], sku_mapping.norm_shopify_handles, 5)
+        scores += bonus_rows[variant_idx[block]]
+
+        best_idx[block] = scores.argmax(axis=1)
+        best_scores[block] = scores[np.arange(len(scores)), best_idx[block]]
+
+    for i, idx, score in zip(fuzzy, best_idx, best_scores.tolist()):
+        record(i, idx, score)
+    return matches
+
+
+def find_best_match(shopify_product: dict, sku_mapping: SkuMapping) -> dict | None:
+    """Find the best matching SKU for a single Shopify product."""
+    return find_best_matches([shopify_product], sku_mapping)[0]
+
+
+def _export_columns(header: list[str]) -> tuple[int, int, int, int]:
+    """Indices of the Handle, Title, Tags and Variant SKU columns."""
+    return (header.index('Handle'), header.index('Title'),
+            header.index('Tags'), header.index('Variant SKU'))
+
+
+def _iter_updated_rows(shopify_path: str, sku_by_handle: dict[str, str]) -> Iterator[list[str]]:
+    """Re-read the export and yield each row with its matched SKU applied.
+
+    sku_by_handle maps each matched product's handle to its SKU. Every row of
+    a product shares the handle, so the main row and its image/variant rows
+    are all updated by one lookup, with no state carried between rows.
+    """
+    header, rows = load_shopify_export(shopify_path)
+    handle_idx, title_idx, _, sku_idx = _export_columns(header)
+    yield header
+
+    for row in rows:
+        sku = sku_by_handle.get(row[handle_idx])
+        # Main rows always take the SKU; image/variant rows (no title) only
+        # where they already carry one
+        if sku is not None and len(row) > sku_idx and (row[title_idx] or row[sku_idx]):
+            row[sku_idx] = sku
+        yield row
 
 
-def process_shopify_export(shopify_path: str, sku_mapping_path: str) -> tuple[list, list, list]:
-    """Process Shopify export and match with SKU mapping."""
+def process_shopify_export(shopify_path: str, sku_mapping_path: str) -> tuple[list, list, Iterator]:
+    """Process Shopify export and match with SKU mapping.
+
+    The export is read twice, streaming both times: once here to match every
+    main product row in one batch, and again lazily as the returned updated
+    rows are consumed (only when a CSV is actually written).
+    """
     # Load data
     sku_mapping = load_sku_mapping(sku_mapping_path)
     header, rows = load_shopify_export(shopify_path)
-
-    # Find column indices
-    handle_idx = header.index('Handle')
-    title_idx = header.index('Title')
-    tags_idx = header.index('Tags')
-    sku_idx = header.index('Variant SKU')
+    handle_idx, title_idx, tags_idx, sku_idx = _export_columns(header)
+
+    # Collect the main product rows (the ones with a title)
+    shopify_products = [
+        {
+            'handle': row[handle_idx],
+            'title': row[title_idx],
+            'tags': row[tags_idx] if tags_idx < len(row) else '',
+            'current_sku': row[sku_idx] if sku_idx < len(row) else '',
+        }
+        for row in rows
+        if row[title_idx]
+    ]
+    product_matches = find_best_matches(shopify_products, sku_mapping)
 
     matched = []
     unmatched = []
-    updated_rows = [header]  # Start with header
-
-    current_handle = None
-    current_match = None
-
-    for row in rows:
-        handle = row[handle_idx]
-        title = row[title_idx]
-        tags = row[tags_idx] if tags_idx < len(row) else ''
-
-        # New product (has title) or continuation (same handle, no title)
-        if title:  # Main product row
-            current_handle = handle
-            shopify_product = {
-                'handle': handle,
-                'title': title,
-                'tags': tags,
-                'current_sku': row[sku_idx] if sku_idx < len(row) else '',
-            }
-            current_match = find_best_match(shopify_product, sku_mapping)
-
-            if current_match:
-                matched.append({
-                    'shopify': shopify_product,
-                    'match': current_match,
-                })
-                # Update SKU in row
-                new_row = row.copy()
-                if len(new_row) > sku_idx:
-                    new_row[sku_idx] = current_match['sku']
-                updated_rows.append(new_row)
-            else:
-                unmatched.append(shopify_product)
-                updated_rows.append(row)
+    sku_by_handle = {}
+    for shopify_product, match in zip(shopify_products, product_matches):
+        if match:
+            matched.append({
+                'shopify': shopify_product,
+                'match': match,
+            })
+            sku_by_handle[shopify_product['handle']] = match['sku']
         else:
-            # Image/variant row - apply same SKU as parent product
-            new_row = row.copy()
-            if current_match and handle == current_handle:
-                if len(new_row) > sku_idx and new_row[sku_idx]:
-                    new_row[sku_idx] = current_match['sku']
-            updated_rows.append(new_row)
+            unmatched.append(shopify_product)
 
-    return matched, unmatched, updated_rows
+    return matched, unmatched, _iter_updated_rows(shopify_path, sku_by_handle)
 
 
 def print_summary(matched: list, unmatched: list):
@@ -290,11 +496,23 @@ def print_summary(matched: list, unmatched: list):
     print()
 
 
-def save_updated_csv(rows: list, output_path: str):
-    """Save updated CSV."""
-    with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerows(rows)
+def save_updated_csv(rows: Iterable[list[str]], output_path: str):
+    """Save updated CSV, writing rows as they are produced.
+
+    The rows may still be streaming from the export, and output_path may be
+    that same export, so they go to a temporary file beside it which only
+    replaces output_path once every row has been written.
+    """
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=CSV_WRITE_BUFFER) as f:
+            writer = csv.writer(f)
+            writer.writerows(rows)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     logger.info(f"Saved updated CSV to: {output_path}")
 
 